@@ -0,0 +1,99 @@
+"""
+Microbenchmark of per-record validation cost in both phases.
+
+    python common/benchmark_validation.py [--records 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "phase1"))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "phase2"))
+
+from common.validation import validate_israeli_id, apply_rules  # noqa: E402
+
+FORM_RECORD = {
+    "lastName": "כהן",
+    "firstName": "משה",
+    "idNumber": "039337423",
+    "gender": "זכר",
+    "dateOfBirth": {"day": "1", "month": "2", "year": "1990"},
+    "address": {"street": "הרצל", "houseNumber": "5", "city": "חיפה", "postalCode": "1234567", "poBox": ""},
+    "landlinePhone": "",
+    "mobilePhone": "0501234567",
+    "dateOfInjury": {"day": "3", "month": "4", "year": "2024"},
+    "timeOfInjury": "12:30",
+    "accidentLocation": "במפעל",
+    "accidentAddress": "הרצל 5 חיפה",
+    "accidentDescription": "החלקתי",
+    "injuredBodyPart": "יד",
+    "signature": "משה כהן",
+    "formFillingDate": {"day": "5", "month": "4", "year": "2024"},
+    "formReceiptDateAtClinic": {"day": "6", "month": "4", "year": "2024"},
+    "medicalInstitutionFields": {"healthFundMember": "מכבי", "natureOfAccident": "", "medicalDiagnoses": ""},
+}
+
+CHAT_RECORD = {
+    "personalInfo": {"firstName": "Moshe", "lastName": "Cohen", "idNumber": "039337423", "gender": "Male", "age": "34"},
+    "healthInsurance": {"hmoName": "מכבי", "hmoCardNumber": "123456789", "membershipTier": "זהב"},
+}
+
+
+def legacy_validate_tz(tz_number):
+    """The original list-building implementation, kept as a reference point"""
+    if not tz_number or not tz_number.isdigit() or len(tz_number) > 9:
+        return (False, "Invalid format (must be up to 9 digits)")
+    tz_padded = tz_number.zfill(9)
+    pattern = [1, 2, 1, 2, 1, 2, 1, 2, 1]
+    multiplied = [int(tz_padded[i]) * pattern[i] for i in range(9)]
+    summed = []
+    for num in multiplied:
+        if num > 9:
+            summed.append(sum(map(int, str(num))))
+        else:
+            summed.append(num)
+    return (True, "Valid TZ number") if sum(summed) % 10 == 0 else (False, "Invalid TZ number (checksum failed)")
+
+
+def per_record_us(func, records):
+    start = time.perf_counter()
+    for record in records:
+        func(record)
+    return (time.perf_counter() - start) / len(records) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validation microbenchmark")
+    parser.add_argument("--records", type=int, default=20000, help="Number of records per measurement")
+    args = parser.parse_args()
+
+    from validator import Validator, records_to_columns
+    from backend.ai_processor import FIELD_RULES
+
+    validator = Validator()
+    form_records = [FORM_RECORD] * args.records
+    chat_records = [CHAT_RECORD] * args.records
+    ids = [FORM_RECORD["idNumber"]] * args.records
+
+    def validate_chat(record):
+        for section, rules in FIELD_RULES.items():
+            apply_rules(record.get(section, {}), rules)
+
+    columns = records_to_columns(form_records)
+    start = time.perf_counter()
+    validator.validate_batch(columns)
+    batch_us = (time.perf_counter() - start) / args.records * 1e6
+
+    print(f"Per-record cost over {args.records} records:")
+    print(f"  {'TZ checksum (legacy)':<40} {per_record_us(legacy_validate_tz, ids):8.2f} us")
+    print(f"  {'TZ checksum (shared)':<40} {per_record_us(validate_israeli_id, ids):8.2f} us")
+    print(f"  {'phase1 Validator.validate_all':<40} {per_record_us(validator.validate_all, form_records):8.2f} us")
+    print(f"  {'phase1 Validator.validate_batch':<40} {batch_us:8.2f} us")
+    print(f"  {'phase2 field rules':<40} {per_record_us(validate_chat, chat_records):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Client-side rate limiting for the Azure OpenAI, embedding and Document Intelligence calls.
+
+Each deployment gets one Governor per process, which
+- keeps requests-per-minute and tokens-per-minute budgets as token buckets,
+- pauses all callers for the Retry-After period of a throttled (429) response and retries the call,
+- adapts the number of concurrent calls (additive increase, multiplicative decrease on 429), and
+- admits waiting callers in priority order, so interactive requests go ahead of batch work.
+
+Both plain and asyncio callers share the same budgets:
+
+    governor = get_governor(deployment_name)
+    response = governor.call(client.chat.completions.create, messages=..., tokens=estimate)
+    response = await governor.call_async(async_client.chat.completions.create, messages=...)
+
+Budgets are configured per deployment with GOVERNOR_<NAME>_RPM, GOVERNOR_<NAME>_TPM and
+GOVERNOR_<NAME>_MAX_CONCURRENCY, where <NAME> is the deployment name in upper case with
+non-alphanumeric characters replaced by underscores (e.g. GOVERNOR_GPT_4O_TPM).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from common.profiling import stage
+
+logger = logging.getLogger(__name__)
+
+# Priorities, lower values are admitted first
+INTERACTIVE = 0
+BATCH = 10
+
+
+class _Bucket:
+    """Token bucket refilled continuously at per_minute / 60 per second. No limit if per_minute is None."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount, now):
+        if self.capacity is None:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+        # A single request larger than the whole budget only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount):
+        if self.capacity is not None:
+            self.level -= amount
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "wake")
+
+    def __init__(self, priority, seq, tokens, wake):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.wake = wake
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Governor:
+    """
+    Rate limit and concurrency governor of a single deployment.
+
+    Args:
+        name: Deployment name, used in log messages
+        rpm: Requests per minute budget, or None for no limit
+        tpm: Tokens per minute budget, or None for no limit
+        max_concurrency: Upper bound of the adaptive concurrency limit
+        initial_concurrency: Concurrency limit to start with; defaults to max_concurrency without
+            rpm/tpm budgets, otherwise to 4, growing as calls succeed
+        max_retries: Number of times a throttled call is retried before the error is raised
+    """
+
+    def __init__(self, name, rpm=None, tpm=None, max_concurrency=16, initial_concurrency=None, max_retries=5):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        if initial_concurrency is None:
+            initial_concurrency = max_concurrency if rpm is None and tpm is None else 4
+        self.concurrency_limit = min(initial_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.in_flight = 0
+
+        self._requests = _Bucket(rpm)
+        self._tokens = _Bucket(tpm)
+        self._blocked_until = 0.0
+        self._successes = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+        logger.info(
+            f"Governor for {name}: rpm {rpm or 'unlimited'}, tpm {tpm or 'unlimited'}, "
+            f"concurrency {self.concurrency_limit} (max {max_concurrency})"
+        )
+
+    def acquire(self, priority=INTERACTIVE, tokens=0):
+        """Block until a call with the given estimated token count may start. Pair with release."""
+        event = threading.Event()
+        waiter = self._enqueue(priority, tokens, event.set)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(waiter)
+                    if wait == 0:
+                        return
+                    event.clear()
+                event.wait(timeout=wait)
+        except BaseException:
+            self._dequeue(waiter)
+            raise
+
+    async def acquire_async(self, priority=INTERACTIVE, tokens=0):
+        """Async version of acquire, waits without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(priority, tokens, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(waiter)
+                    if wait == 0:
+                        return
+                    event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._dequeue(waiter)
+            raise
+
+    def release(self, success=True, retry_after=None, tokens=0, used_tokens=None):
+        """
+        Finish a call started with acquire
+
+        Args:
+            success: Whether the call succeeded; failures other than throttling leave the limit unchanged
+            retry_after: Seconds to pause all callers for, if the call was throttled
+            tokens: The estimate passed to acquire
+            used_tokens: Tokens actually used, corrects the tokens-per-minute budget if known
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self._tokens.take(used_tokens - tokens)
+
+            if retry_after is not None:
+                self.concurrency_limit = max(1, self.concurrency_limit // 2)
+                self._successes = 0
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                logger.warning(
+                    f"{self.name} throttled, pausing {retry_after:.1f}s "
+                    f"with concurrency limit {self.concurrency_limit}"
+                )
+            elif success:
+                # Raise the limit by one after a full window of successful calls
+                self._successes += 1
+                if self._successes >= self.concurrency_limit and self.concurrency_limit < self.max_concurrency:
+                    self.concurrency_limit += 1
+                    self._successes = 0
+
+            self._wake_all()
+
+    def call(self, func, *args, priority=INTERACTIVE, tokens=0, **kwargs):
+        """Run func(*args, **kwargs) within the budgets, retrying throttled calls"""
+        for attempt in range(self.max_retries + 1):
+            with stage("rate_limit_wait"):
+                self.acquire(priority, tokens)
+            try:
+                with stage(f"network:{self.name}"):
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                retry_after = self._retry_after(e, attempt)
+                self.release(success=False, retry_after=retry_after, tokens=tokens)
+                if retry_after is None:
+                    raise
+                continue
+            self.release(tokens=tokens, used_tokens=_used_tokens(result))
+            return result
+
+    async def call_async(self, func, *args, priority=INTERACTIVE, tokens=0, **kwargs):
+        """Async version of call, for coroutine functions"""
+        for attempt in range(self.max_retries + 1):
+            with stage("rate_limit_wait"):
+                await self.acquire_async(priority, tokens)
+            try:
+                with stage(f"network:{self.name}"):
+                    result = await func(*args, **kwargs)
+            except Exception as e:
+                retry_after = self._retry_after(e, attempt)
+                self.release(success=False, retry_after=retry_after, tokens=tokens)
+                if retry_after is None:
+                    raise
+                continue
+            self.release(tokens=tokens, used_tokens=_used_tokens(result))
+            return result
+
+    def _retry_after(self, error, attempt):
+        """Seconds to wait before retrying a throttled call, or None if the error should be raised"""
+        if getattr(error, "status_code", None) != 429 or attempt == self.max_retries:
+            return None
+        return retry_after_seconds(error, default=min(2 ** attempt, 60))
+
+    def _enqueue(self, priority, tokens, wake):
+        waiter = _Waiter(priority, next(self._seq), tokens, wake)
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+        return waiter
+
+    def _dequeue(self, waiter):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._wake_all()
+
+    def _try_acquire(self, waiter):
+        """
+        Admit the waiter if it is first in line and the budgets allow it. Called with the lock held.
+
+        Returns:
+            0 if admitted, otherwise the number of seconds to wait, or None to wait until woken
+        """
+        if self._waiters[0] is not waiter:
+            return None
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self.in_flight >= self.concurrency_limit:
+            return None
+        wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(waiter.tokens, now))
+        if wait > 0:
+            return wait
+
+        self._requests.take(1)
+        self._tokens.take(waiter.tokens)
+        self.in_flight += 1
+        heapq.heappop(self._waiters)
+        self._wake_all()
+        return 0
+
+    def _wake_all(self):
+        for waiter in self._waiters:
+            waiter.wake()
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(name):
+    """Return the process-wide governor of a deployment, created from its GOVERNOR_<NAME>_* settings"""
+    with _governors_lock:
+        if name not in _governors:
+            prefix = "GOVERNOR_" + re.sub(r"[^A-Za-z0-9]", "_", str(name)).upper()
+            rpm = os.getenv(f"{prefix}_RPM")
+            tpm = os.getenv(f"{prefix}_TPM")
+            initial = os.getenv(f"{prefix}_INITIAL_CONCURRENCY")
+            _governors[name] = Governor(
+                name,
+                rpm=int(rpm) if rpm else None,
+                tpm=int(tpm) if tpm else None,
+                max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "16")),
+                initial_concurrency=int(initial) if initial else None,
+            )
+        return _governors[name]
+
+
+def estimate_tokens(messages, completion_tokens=500):
+    """Rough token estimate of a chat request (about four characters per token plus the expected answer)"""
+    if isinstance(messages, str):
+        characters = len(messages)
+    else:
+        characters = sum(len(message.get("content") or "") for message in messages)
+    return (characters + 3) // 4 + completion_tokens
+
+
+def retry_after_seconds(error, default):
+    """Read the Retry-After header of a throttled response, falling back to default"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after_ms = headers.get("retry-after-ms")
+    retry_after = headers.get("Retry-After")
+    try:
+        if retry_after_ms is not None:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        return max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def _used_tokens(result):
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "total_tokens", None)
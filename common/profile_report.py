@@ -0,0 +1,118 @@
+"""
+Summarize the request profiles written by common.profiling.
+
+    python -m common.profile_report [profiles] [--label chat] [--top 25] [--sort tottime]
+                                    [--folded merged.folded]
+
+Prints the wall-clock breakdown per stage across requests (stages nest, so their shares can add
+up to more than 100%), the hot functions of the merged cProfile statistics, and the hottest
+sampled stacks. --folded writes the merged samples for a
+flamegraph (flamegraph.pl merged.folded > flame.svg, or open it in speedscope).
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import pstats
+import statistics
+from collections import Counter, defaultdict
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def load_summaries(paths):
+    summaries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            summaries.append(json.load(file))
+    return summaries
+
+
+def stage_report(summaries):
+    totals = [summary["total_seconds"] for summary in summaries]
+    per_stage = defaultdict(list)
+    for summary in summaries:
+        for name, timing in summary["stages"].items():
+            per_stage[name].append(timing["seconds"])
+
+    lines = [
+        f"{len(summaries)} requests, wall-clock mean {statistics.mean(totals):.3f}s, "
+        f"p50 {percentile(totals, 0.5):.3f}s, p95 {percentile(totals, 0.95):.3f}s",
+        f"  {'stage':<32}{'requests':>9}{'mean s':>9}{'p95 s':>9}{'share':>8}",
+    ]
+    total_time = sum(totals)
+    for name, seconds in sorted(per_stage.items(), key=lambda item: -sum(item[1])):
+        lines.append(
+            f"  {name:<32}{len(seconds):>9}{statistics.mean(seconds):>9.3f}"
+            f"{percentile(seconds, 0.95):>9.3f}{sum(seconds) / total_time:>8.1%}"
+        )
+    return "\n".join(lines)
+
+
+def function_report(paths, sort, top):
+    output = io.StringIO()
+    stats = pstats.Stats(*paths, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return output.getvalue()
+
+
+def merge_folded(paths):
+    stacks = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize request profiles")
+    parser.add_argument("directory", nargs="?", default=os.getenv("PROFILE_DIR", "profiles"),
+                        help="Directory with the profiles (default PROFILE_DIR or profiles)")
+    parser.add_argument("--label", help="Only requests of this kind, e.g. chat or form")
+    parser.add_argument("--top", type=int, default=25, help="Number of functions and stacks to show")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key, e.g. cumulative or tottime")
+    parser.add_argument("--folded", help="Write the merged sampled stacks to this file")
+    args = parser.parse_args()
+
+    pattern = f"*_{args.label}_*" if args.label else "*"
+
+    def files(extension):
+        return sorted(glob.glob(os.path.join(args.directory, pattern + extension)))
+
+    summaries = load_summaries(files(".json"))
+    if not summaries:
+        print(f"No profiles found in {args.directory}")
+        return
+    print(stage_report(summaries))
+
+    prof_files = files(".prof")
+    if prof_files:
+        print(f"\nHot functions over {len(prof_files)} cProfile profiles:")
+        print(function_report(prof_files, args.sort, args.top))
+
+    folded_files = files(".folded")
+    if folded_files:
+        stacks = merge_folded(folded_files)
+        samples = sum(stacks.values())
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        print(f"\nHot frames over {samples} samples of {len(folded_files)} profiles:")
+        for frame, count in leaves.most_common(args.top):
+            print(f"  {count / samples:>6.1%}  {frame}")
+        if args.folded:
+            with open(args.folded, "w", encoding="utf-8") as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+            print(f"\nWrote merged stacks to {args.folded}")
+
+
+if __name__ == "__main__":
+    main()
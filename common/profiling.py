@@ -0,0 +1,177 @@
+"""
+Opt-in per-request profiling for both phases.
+
+A profiled request records its wall-clock time split into named stages (see stage()) and a
+profile of the thread running it, written to PROFILE_DIR:
+    <time>_<label>_<id>.json     wall-clock total and per-stage breakdown
+    <time>_<label>_<id>.prof     cProfile statistics (PROFILE_MODE=cprofile, the default)
+    <time>_<label>_<id>.folded   sampled stacks in the collapsed format read by flamegraph.pl
+                                 and speedscope (PROFILE_MODE=sampling)
+
+Profiling is enabled for every request with PROFILING=1, or per request (for instance from an
+X-Profile header). `python -m common.profile_report` aggregates the files of many requests.
+"""
+import cProfile
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+
+# Stage timings of the request profiled in the current context, None when not profiling
+_current = contextvars.ContextVar("profile", default=None)
+
+
+def profiling_enabled():
+    return os.getenv("PROFILING", "").lower() in ("1", "true", "yes")
+
+
+def requested(header_value):
+    """Profiling flag of a request from its X-Profile header: True if set to 1/true/yes, otherwise None (PROFILING decides)"""
+    if header_value and header_value.lower() in ("1", "true", "yes"):
+        return True
+    return None
+
+
+def profile_dir():
+    return os.getenv("PROFILE_DIR", "profiles")
+
+
+class _Breakdown:
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            total, count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + seconds, count + 1)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as a stage of the request being profiled; does nothing otherwise"""
+    breakdown = _current.get()
+    if breakdown is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        breakdown.add(name, time.perf_counter() - start)
+
+
+class _Sampler:
+    """Samples the stack of one thread at a fixed interval, counting collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+
+@contextmanager
+def profile_request(label, enabled=None):
+    """
+    Profile the block as one request when enabled (default: PROFILING). The profile covers the
+    calling thread; stages also include work in threads started with asyncio.to_thread, or
+    submitted to an executor through contextvars.copy_context().run (plain executor tasks do
+    not see the request's context).
+
+    Args:
+        label: Kind of request, used in the file names (e.g. "chat", "form")
+        enabled: Profile this request regardless of PROFILING (True) or not at all (False)
+    """
+    if enabled is None:
+        enabled = profiling_enabled()
+    if not enabled:
+        yield
+        return
+
+    breakdown = _Breakdown()
+    token = _current.set(breakdown)
+    mode = os.getenv("PROFILE_MODE", "cprofile")
+    profiler = sampler = None
+    if mode == "sampling":
+        sampler = _Sampler(threading.get_ident(), float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000)
+        sampler.start()
+    else:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this thread; keep the stage timings only
+            profiler = None
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        if sampler is not None:
+            sampler.stop()
+        _current.reset(token)
+        try:
+            _write_profile(label, total, breakdown, profiler, sampler)
+        except OSError as e:
+            logger.error(f"Error writing the profile of a {label} request: {e}")
+
+
+def _write_profile(label, total, breakdown, profiler, sampler):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{label}_{uuid.uuid4().hex[:8]}")
+
+    summary = {
+        "label": label,
+        "total_seconds": total,
+        "stages": {
+            name: {"seconds": seconds, "count": count} for name, (seconds, count) in breakdown.stages.items()
+        },
+    }
+    with open(base + ".json", "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2)
+    if profiler is not None:
+        profiler.dump_stats(base + ".prof")
+    if sampler is not None:
+        with open(base + ".folded", "w", encoding="utf-8") as file:
+            for stack, count in sampler.stacks.items():
+                file.write(f"{stack} {count}\n")
+
+    logger.info(
+        f"Profiled {label} request in {total:.3f}s: "
+        + ", ".join(f"{name} {seconds:.3f}s" for name, (seconds, _) in breakdown.stages.items())
+        + f" -> {base}"
+    )
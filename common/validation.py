@@ -0,0 +1,115 @@
+"""
+Validation rules shared by the phase1 form validator and the phase2 chatbot.
+
+Patterns and option sets are built once at import time, so validating a record
+only runs the checks themselves.
+"""
+import re
+
+# Patterns
+HEBREW_ENGLISH_REGEX = re.compile(r'^[A-Za-zא-ת\s]+$')
+STREET_REGEX = re.compile(r'^[A-Za-zא-ת0-9\s]+$')
+LANDLINE_REGEX = re.compile(r'^0\d\d{7}$')
+MOBILE_REGEX = re.compile(r'^05\d\d{7}$')
+TIME_REGEX = re.compile(r'^\d{2}:\d{2}$')
+
+# Alternating 1-2 weights of the Israeli ID checksum
+TZ_WEIGHTS = (1, 2, 1, 2, 1, 2, 1, 2, 1)
+
+# Option sets
+FORM_GENDERS = ['male', 'female', 'זכר', 'נקבה']
+CHAT_GENDERS = ['male', 'female', 'other', 'זכר', 'נקבה', 'אחר']
+HEALTH_FUND_OPTIONS = [
+    'כללית', 'מאוחדת', 'מכבי', 'לאומית',
+    'הנפגע חבר בקופת חולים', 'הנפגע אינו חבר בקופת חולים'
+]
+HMO_NAMES = ['מכבי', 'מאוחדת', 'כללית']
+MEMBERSHIP_TIERS = ['זהב', 'כסף', 'ארד']
+
+
+def validate_israeli_id(tz_number):
+    """
+    Validates an Israeli ID number (TZ) using the official algorithm.
+    Returns an (is_valid, message) tuple.
+    """
+    if not tz_number or not tz_number.isdigit() or len(tz_number) > 9:
+        return (False, "Invalid format (must be up to 9 digits)")
+
+    # Pad the number with leading zeros to make it 9 digits, multiply each digit by the
+    # alternating 1-2 pattern and sum the digits of the products (which are at most 18)
+    total_sum = 0
+    for digit, weight in zip(tz_number.zfill(9), TZ_WEIGHTS):
+        num = int(digit) * weight
+        total_sum += num - 9 if num > 9 else num
+
+    if total_sum % 10 == 0:
+        return (True, "Valid TZ number")
+    return (False, "Invalid TZ number (checksum failed)")
+
+
+def is_valid_name(value):
+    """Validates a name contains only Hebrew or English letters and spaces"""
+    return HEBREW_ENGLISH_REGEX.match(value) is not None
+
+
+# Rule builders. Each returns a check function mapping a value to an (is_valid, message) tuple.
+
+def matches(pattern, message):
+    def check(value):
+        if pattern.match(value) is None:
+            return (False, message)
+        return (True, "Valid")
+    return check
+
+
+def one_of(options, message=None, case_insensitive=False):
+    allowed = frozenset(o.lower() for o in options) if case_insensitive else frozenset(options)
+    message = message or f"Must be one of: {', '.join(options)}"
+
+    def check(value):
+        if (value.lower() if case_insensitive else value) not in allowed:
+            return (False, message)
+        return (True, "Valid")
+    return check
+
+
+def digits_only(message):
+    def check(value):
+        if not value.isdigit():
+            return (False, message)
+        return (True, "Valid")
+    return check
+
+
+def int_between(low, high, range_message, type_message):
+    def check(value):
+        try:
+            number = int(value)
+        except ValueError:
+            return (False, type_message)
+        if not low <= number <= high:
+            return (False, range_message)
+        return (True, "Valid")
+    return check
+
+
+def apply_rules(values, rules):
+    """
+    Run a table of (field, check) rules over a dictionary of values.
+    Empty fields are skipped, since missing data is not an error while it is still being collected.
+
+    Returns:
+        Tuple of (validated values, errors by field)
+    """
+    validated = {}
+    errors = {}
+    for field, check in rules:
+        value = values.get(field, "")
+        if not value:
+            continue
+        is_valid, message = check(value)
+        if is_valid:
+            validated[field] = value
+        else:
+            errors[field] = message
+    return validated, errors
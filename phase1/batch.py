@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Make the project root importable, for the validation rules shared with phase2
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pipeline import FormPipeline
+from result_cache import ResultCache
+from ledger import BatchLedger, STAGES
+from common.governor import BATCH
+
+# Configure root logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)],
+)
+
+# Set specific loggers to higher levels to reduce output
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("httpcore").setLevel(logging.WARNING)
+logging.getLogger("urllib3").setLevel(logging.WARNING)
+logging.getLogger("azure").setLevel(logging.WARNING)
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".jpg", ".jpeg")
+
+
+def collect_files(inputs):
+    """
+    Expand a list of files, directories and glob patterns into a sorted list of form files
+    """
+    files = set()
+
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, filenames in os.walk(item):
+                for filename in filenames:
+                    if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                        files.add(os.path.join(root, filename))
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            for path in glob.glob(item, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS):
+                    files.add(path)
+
+    return sorted(files)
+
+
+def build_summary(records, elapsed):
+    """
+    Aggregate per-document records into a summary report
+    """
+    succeeded = [r for r in records if r["status"] == "ok"]
+    failed = [r for r in records if r["status"] != "ok"]
+
+    invalid_field_counts = Counter()
+    for record in succeeded:
+        invalid_field_counts.update(record["invalid_fields"])
+
+    average_timings = {}
+    for stage in ("ocr", "extraction", "validation"):
+        values = [r["timings"][stage] for r in succeeded if stage in r["timings"]]
+        average_timings[stage] = sum(values) / len(values) if values else 0.0
+
+    reductions = [r["prompt_stats"]["reduction"] for r in succeeded if r["prompt_stats"]]
+
+    return {
+        "total": len(records),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "fully_valid": sum(1 for r in succeeded if not r["invalid_fields"]),
+        "llm_skipped": sum(1 for r in succeeded if r["llm_skipped"]),
+        "resumed": sum(1 for r in records if r.get("resumed_stages")),
+        "elapsed_seconds": elapsed,
+        "documents_per_minute": len(records) / elapsed * 60 if elapsed > 0 else 0.0,
+        "average_timings": average_timings,
+        "average_prompt_reduction": sum(reductions) / len(reductions) if reductions else 0.0,
+        "invalid_field_counts": dict(invalid_field_counts.most_common()),
+        "errors": {r["file"]: r["error"] for r in failed},
+    }
+
+
+def run_batch(files, pipeline, output_path, max_workers=4, ledger=None):
+    """
+    Process files with at most max_workers documents in flight.
+    Results are appended to output_path as JSONL in completion order.
+    With a BatchLedger, stages completed by an earlier run are not repeated.
+
+    Returns:
+        Tuple of (list of per-document records, elapsed seconds)
+    """
+    records = []
+    processed = 0
+    start_time = time.time()
+
+    with open(output_path, "w", encoding="utf-8") as output_file, ThreadPoolExecutor(
+        max_workers=max_workers
+    ) as executor:
+        futures = {executor.submit(pipeline.process, path, ledger): path for path in files}
+
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output_file.flush()
+
+            if len(record["resumed_stages"]) == len(STAGES):
+                logger.info(f"[{len(records)}/{len(files)}] {record['file']}: already completed")
+                continue
+
+            processed += 1
+            if record["status"] == "ok":
+                if record["llm_skipped"]:
+                    extraction = "LLM skipped"
+                else:
+                    extraction = f"prompt reduced by {record['prompt_stats']['reduction']:.0%}"
+                logger.info(
+                    f"[{len(records)}/{len(files)}] {record['file']}: "
+                    f"{len(record['invalid_fields'])} invalid fields, "
+                    f"{len(record['rule_fields'])} fields read by rules, {extraction}"
+                )
+            else:
+                logger.error(f"[{len(records)}/{len(files)}] {record['file']}: {record['error']}")
+
+            if processed % 10 == 0:
+                log_throughput(processed, len(files) - len(records), time.time() - start_time)
+
+    return records, time.time() - start_time
+
+
+def log_throughput(processed, remaining, elapsed):
+    rate = processed / elapsed * 60 if elapsed > 0 else 0.0
+    eta = remaining / rate * 60 if rate else 0.0
+    logger.info(f"Throughput: {rate:.1f} docs/min, {remaining} remaining, ETA {eta / 60:.1f} min")
+
+
+def report_progress(ledger):
+    """Log the state of a batch run recorded in a ledger"""
+    progress = ledger.progress()
+    stages = ", ".join(f"{stage}: {count}" for stage, count in progress["stages"].items())
+    logger.info(f"{progress['total']} documents in {ledger.path} (last completed stage - {stages})")
+    logger.info(f"{progress['failed']} documents failed their last attempt")
+    if progress["last_update"]:
+        logger.info(f"Last update: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(progress['last_update']))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch process ביטוח לאומי forms")
+    parser.add_argument(
+        "inputs", nargs="*", help="Files, directories or glob patterns of PDF/JPG forms"
+    )
+    parser.add_argument(
+        "-o", "--output", default="batch_results.jsonl", help="Path of the JSONL results file"
+    )
+    parser.add_argument(
+        "--summary", default=None, help="Path of the summary report (default: <output>.summary.json)"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=4, help="Maximum number of documents processed concurrently"
+    )
+    parser.add_argument(
+        "--cache-dir", default=None, help="Reuse OCR/extraction results stored in this directory"
+    )
+    parser.add_argument(
+        "--pages-per-chunk",
+        type=int,
+        default=None,
+        help="Split long PDFs into chunks of this many pages and analyze them concurrently",
+    )
+    parser.add_argument(
+        "--work-dir",
+        default=None,
+        help="Record per-document progress in this directory; re-running with it resumes the batch",
+    )
+    parser.add_argument(
+        "--report", action="store_true", help="Report the progress recorded in --work-dir and exit"
+    )
+    args = parser.parse_args()
+
+    ledger = BatchLedger(args.work_dir) if args.work_dir else None
+    if args.report:
+        if ledger is None:
+            parser.error("--report requires --work-dir")
+        report_progress(ledger)
+        return
+
+    files = collect_files(args.inputs)
+    if not files:
+        logger.error("No PDF/JPG files found")
+        sys.exit(1)
+
+    logger.info(f"Processing {len(files)} files with {args.workers} workers")
+    cache = ResultCache(args.cache_dir) if args.cache_dir else None
+    pipeline = FormPipeline(cache=cache, pages_per_chunk=args.pages_per_chunk, priority=BATCH)
+    records, elapsed = run_batch(files, pipeline, args.output, max_workers=args.workers, ledger=ledger)
+
+    summary = build_summary(records, elapsed)
+    summary_path = args.summary or f"{os.path.splitext(args.output)[0]}.summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    if ledger is not None:
+        report_progress(ledger)
+    logger.info(
+        f"Done: {summary['succeeded']} succeeded, {summary['failed']} failed "
+        f"in {elapsed:.1f}s ({summary['documents_per_minute']:.1f} docs/min)"
+    )
+    logger.info(f"Results written to {args.output}, summary to {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
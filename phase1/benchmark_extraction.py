@@ -0,0 +1,134 @@
+"""
+Compares single-call field extraction with parallel per-group calls (SCHEMA_GROUPS):
+wall-clock time, prompt tokens and completion tokens.
+
+    python phase1/benchmark_extraction.py [--runs 3]                   # simulated model
+    python phase1/benchmark_extraction.py --file form.pdf [--runs 3]   # Azure deployment
+
+The simulated model answers each call after a fixed overhead plus a delay per output token,
+as generation dominates extraction latency. With --file, the form is OCR'd once and both
+paths call the configured deployment; the result cache is not used.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+PHASE1_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(PHASE1_DIR)
+sys.path.insert(0, PHASE1_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+
+from markdown_filter import estimate_tokens  # noqa: E402
+from openai_processor import OpenAIProcessor, OUTPUT_SCHEMA, flatten_fields, schema_paths  # noqa: E402
+
+SAMPLE_RECORD = {
+    "lastName": "כהן", "firstName": "משה", "idNumber": "039337423", "gender": "זכר",
+    "dateOfBirth": {"day": "01", "month": "02", "year": "1990"},
+    "address": {"street": "הרצל", "houseNumber": "5", "entrance": "א", "apartment": "12", "city": "חיפה",
+                "postalCode": "3303105", "poBox": ""},
+    "landlinePhone": "048123456", "mobilePhone": "0501234567", "jobType": "מלצר",
+    "dateOfInjury": {"day": "03", "month": "04", "year": "2024"}, "timeOfInjury": "12:30",
+    "accidentLocation": "במקום העבודה", "accidentAddress": "הרצל 5 חיפה",
+    "accidentDescription": "החלקתי על רצפה רטובה במטבח המסעדה ונפלתי על היד", "injuredBodyPart": "יד ימין",
+    "signature": "משה כהן",
+    "formFillingDate": {"day": "05", "month": "04", "year": "2024"},
+    "formReceiptDateAtClinic": {"day": "06", "month": "04", "year": "2024"},
+    "medicalInstitutionFields": {"healthFundMember": "מכבי", "natureOfAccident": "תאונת עבודה",
+                                 "medicalDiagnoses": "שבר בשורש כף היד"},
+}
+
+
+def sample_ocr_text():
+    """OCR-like markdown holding the sample record's values"""
+    lines = ["# בקשה למתן טיפול רפואי לנפגע עבודה", ""]
+    for path, value in flatten_fields(SAMPLE_RECORD).items():
+        lines.append(f"{path}: {value}")
+    return "\n".join(lines)
+
+
+class SimulatedCompletions:
+    """Answers with the sample values of the requested fields, after a modeled delay"""
+
+    def __init__(self, overhead_ms, per_token_ms):
+        self.overhead_ms = overhead_ms
+        self.per_token_ms = per_token_ms
+
+    def create(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        schema_json = prompt.split("JSON schema:")[1].split("Return only")[0].strip()
+        requested = set(schema_paths(json.loads(schema_json)))
+        values = {path: value for path, value in flatten_fields(SAMPLE_RECORD).items() if path in requested}
+        output = {}
+        for path, value in values.items():
+            *parents, leaf = path.split(".")
+            node = output
+            for part in parents:
+                node = node.setdefault(part, {})
+            node[leaf] = value
+        content = json.dumps(output, ensure_ascii=False, indent=2)
+
+        completion_tokens = estimate_tokens(content)
+        time.sleep((self.overhead_ms + self.per_token_ms * completion_tokens) / 1000)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=estimate_tokens(prompt), completion_tokens=completion_tokens),
+        )
+
+
+def run(processor, ocr_text, runs):
+    """
+    Returns:
+        Tuple of (average wall-clock seconds, statistics of the last run, result of the last run)
+    """
+    elapsed = 0.0
+    for _ in range(runs):
+        start = time.perf_counter()
+        result, stats = processor.extract_fields_with_stats(ocr_text)
+        elapsed += time.perf_counter() - start
+    return elapsed / runs, stats, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-call vs. parallel grouped extraction")
+    parser.add_argument("--file", help="Form to OCR and extract with the Azure deployment")
+    parser.add_argument("--runs", type=int, default=3, help="Extractions per mode")
+    parser.add_argument("--overhead-ms", type=float, default=400, help="Simulated per-call overhead")
+    parser.add_argument("--per-token-ms", type=float, default=20, help="Simulated time per output token")
+    args = parser.parse_args()
+
+    if args.file:
+        from ocr_processor import OCRProcessor
+
+        ocr_text = OCRProcessor().process_document_md(args.file)
+    else:
+        # Client constructors only need syntactically valid settings
+        os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+        os.environ.setdefault("AZURE_OPENAI_KEY", "benchmark")
+        os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-06-01")
+        ocr_text = sample_ocr_text()
+
+    results = {}
+    print(f"{'mode':<10}{'calls':>6}{'wall s':>9}{'prompt tok':>12}{'output tok':>12}")
+    for label, parallel in (("single", False), ("parallel", True)):
+        processor = OpenAIProcessor(parallel_groups=parallel)
+        if not args.file:
+            processor.client = SimpleNamespace(
+                chat=SimpleNamespace(completions=SimpleNamespace(create=SimulatedCompletions(
+                    args.overhead_ms, args.per_token_ms
+                ).create))
+            )
+        seconds, stats, results[label] = run(processor, ocr_text, args.runs)
+        print(f"{label:<10}{stats['calls']:>6}{seconds:>9.2f}{stats['prompt_tokens']:>12}"
+              f"{stats['completion_tokens'] or 0:>12}")
+
+    single = flatten_fields(results["single"])
+    parallel = flatten_fields(results["parallel"])
+    agreeing = sum(1 for path in schema_paths(OUTPUT_SCHEMA) if single.get(path) == parallel.get(path))
+    print(f"\nFields with the same value in both modes: {agreeing} of {len(schema_paths(OUTPUT_SCHEMA))}")
+
+
+if __name__ == "__main__":
+    main()
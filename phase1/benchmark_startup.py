@@ -0,0 +1,81 @@
+"""
+Measures startup and per-rerun overhead of the phase1 Streamlit app.
+
+    python phase1/benchmark_startup.py [--reruns 20]
+
+No requests are sent to Azure; constructing the clients does not touch the network.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PHASE1_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(PHASE1_DIR)
+
+# Client constructors only need syntactically valid settings
+os.environ.setdefault("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT", "https://example.cognitiveservices.azure.com/")
+os.environ.setdefault("AZURE_DOCUMENT_INTELLIGENCE_KEY", "benchmark")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+os.environ.setdefault("AZURE_OPENAI_KEY", "benchmark")
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-06-01")
+
+
+def time_cold_import(statement):
+    """Time a statement in a fresh interpreter, so nothing is already in sys.modules"""
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=PHASE1_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def time_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phase1 startup benchmark")
+    parser.add_argument("--reruns", type=int, default=20, help="Number of simulated reruns")
+    args = parser.parse_args()
+
+    sys.path.insert(0, PHASE1_DIR)
+    sys.path.insert(0, PROJECT_ROOT)
+
+    print("Cold imports (fresh interpreter):")
+    for label, statement in [
+        ("processor modules", "import pipeline"),
+        ("azure document intelligence SDK", "import azure.ai.documentintelligence"),
+        ("openai SDK", "import openai"),
+        ("streamlit", "import streamlit"),
+        ("UI script (job client only)", "import streamlit_ui"),
+    ]:
+        print(f"  {label:<35} {time_cold_import(statement) * 1000:8.1f} ms")
+
+    from pipeline import FormPipeline
+
+    def build_processors():
+        return FormPipeline()
+
+    start = time.perf_counter()
+    build_processors()
+    first_build = time.perf_counter() - start
+
+    print("\nProcessor construction:")
+    print(f"  {'first build (loads SDKs)':<35} {first_build * 1000:8.1f} ms")
+    print(f"  {'uncached rerun':<35} {time_call(build_processors, args.reruns) * 1000:8.1f} ms")
+    print("  (the UI builds none: the job service builds them once at startup)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import logging
+import os
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = os.getenv("PHASE1_SERVICE_URL", "http://localhost:5050")
+
+
+def submit_form(file_name, data, callback_url=None):
+    """
+    Upload a form to the job service
+
+    Args:
+        data: The form's content, as bytes or a binary file object
+
+    Returns:
+        The job's status, with its "job_id"
+    """
+    response = requests.post(
+        f"{API_BASE_URL}/jobs",
+        files={"file": (file_name, data)},
+        data={"callback_url": callback_url} if callback_url else None,
+        timeout=60,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def job_status(job_id):
+    response = requests.get(f"{API_BASE_URL}/jobs/{job_id}", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def job_result(job_id):
+    """
+    Returns:
+        The job's status, with the pipeline record in "result"
+    """
+    response = requests.get(f"{API_BASE_URL}/jobs/{job_id}/result", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def wait_for_job(job_id, poll_interval=1.0, timeout=600, on_status=None):
+    """
+    Poll a job until it finishes
+
+    Args:
+        on_status: Optional function called with each polled status
+
+    Returns:
+        The finished job's status and result
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = job_status(job_id)
+        if on_status:
+            on_status(status)
+        if status["status"] in ("done", "failed"):
+            return job_result(job_id)
+        time.sleep(poll_interval)
+    raise TimeoutError(f"Job {job_id} did not finish within {timeout}s")
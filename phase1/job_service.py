@@ -0,0 +1,228 @@
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+import uvicorn
+from fastapi import FastAPI, File, Form, Header, HTTPException, UploadFile
+
+# Make the project root importable, for the validation rules shared with phase2
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pipeline import FormPipeline
+from common.profiling import requested
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)],
+)
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".jpg", ".jpeg")
+
+
+class JobService:
+    """
+    HTTP job API around the form pipeline. A submitted form is saved to disk and queued, and a
+    bounded pool of worker threads runs it through OCR -> extraction -> validation; clients
+    poll the job's status and fetch its result, or pass a callback URL to be notified.
+
+    Finished jobs are kept for ttl_seconds. Callback URLs are refused unless their host is one of
+    callback_hosts (PHASE1_CALLBACK_HOSTS), so clients cannot make the service call arbitrary hosts.
+    """
+
+    def __init__(
+        self, pipeline=None, workers=None, max_queued=None, ttl_seconds=None, work_dir=None, callback_hosts=None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.app = FastAPI()
+        self.pipeline = pipeline or FormPipeline()
+
+        self.workers = workers or int(os.getenv("PHASE1_WORKERS", "4"))
+        # Submissions are refused beyond this many jobs waiting for a worker
+        self.max_queued = max_queued or int(os.getenv("PHASE1_MAX_QUEUED", "100"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("PHASE1_JOB_TTL", "3600"))
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="phase1_jobs_")
+        os.makedirs(self.work_dir, exist_ok=True)
+        # Hosts (or host:port) that may receive job callbacks; none by default
+        if callback_hosts is None:
+            callback_hosts = [host.strip() for host in os.getenv("PHASE1_CALLBACK_HOSTS", "").split(",")]
+        self.callback_hosts = {host.lower() for host in callback_hosts if host}
+
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="form-worker")
+        # Callbacks are delivered (and retried) by their own threads, so a slow callback host never
+        # holds up a form worker
+        self.callback_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="form-callback")
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+        self.register_endpoints()
+        self.logger.info(f"JobService initialized with {self.workers} workers")
+
+    def register_endpoints(self):
+        @self.app.get("/ping")
+        async def ping():
+            return {"message": "pong"}
+
+        # A plain function, so the upload is copied to disk in the thread pool
+        @self.app.post("/jobs", status_code=202)
+        def submit(file: UploadFile = File(...), callback_url: str = Form(None), x_profile: str = Header(None)):
+            return self.submit(file.filename, file.file, callback_url, profile=requested(x_profile))
+
+        @self.app.get("/jobs/{job_id}")
+        async def status(job_id: str):
+            return self.public_status(self.get_job(job_id))
+
+        @self.app.get("/jobs/{job_id}/result")
+        async def result(job_id: str):
+            job = self.get_job(job_id)
+            if job["status"] not in ("done", "failed"):
+                raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+            return {**self.public_status(job), "result": job["result"]}
+
+    def submit(self, filename, stream, callback_url=None, profile=None):
+        """
+        Save an uploaded form and queue it. With profile, the job is profiled (see common.profiling).
+
+        Returns:
+            The new job's status
+        """
+        extension = os.path.splitext(filename or "")[1].lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type {extension or '(none)'}")
+        if callback_url and not self.callback_allowed(callback_url):
+            raise HTTPException(status_code=400, detail="Callback URL not allowed")
+
+        self.expire_jobs()
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.work_dir, job_id + extension)
+
+        # The limit is checked and the job counted under one lock, so concurrent submissions
+        # cannot exceed it; the job is only handed to a worker once its file is written
+        with self._lock:
+            if self._queued() >= self.max_queued:
+                raise HTTPException(status_code=429, detail="Too many queued jobs, retry later")
+            job = {
+                "job_id": job_id,
+                "file": filename,
+                "path": path,
+                "status": "queued",
+                "error": None,
+                "result": None,
+                "callback_url": callback_url,
+                "profile": profile,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            self.jobs[job_id] = job
+
+        try:
+            with open(path, "wb") as file:
+                shutil.copyfileobj(stream, file)
+        except BaseException:
+            with self._lock:
+                del self.jobs[job_id]
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        self.executor.submit(self.run_job, job)
+        self.logger.info(f"Queued job {job_id} for {filename}")
+        return self.public_status(job)
+
+    def run_job(self, job):
+        """Process a job's form. Runs in a worker thread."""
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        try:
+            record = self.pipeline.process(job["path"], include_text=True, profile=job["profile"])
+            record["file"] = job["file"]
+            job["result"] = record
+            job["error"] = record["error"]
+            job["status"] = "done" if record["status"] == "ok" else "failed"
+        except Exception as e:
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+            try:
+                os.remove(job["path"])
+            except OSError:
+                pass
+
+        self.logger.info(
+            f"Job {job['job_id']} {job['status']} in {job['finished_at'] - job['started_at']:.2f}s "
+            f"after {job['started_at'] - job['created_at']:.2f}s queued"
+        )
+        if job["callback_url"]:
+            self.callback_executor.submit(self.notify, job)
+
+    def notify(self, job, attempts=3):
+        """POST the job's status and result to its callback URL, retrying failed deliveries. Runs in a callback thread."""
+        payload = {**self.public_status(job), "result": job["result"]}
+        for attempt in range(attempts):
+            try:
+                response = requests.post(job["callback_url"], json=payload, timeout=10, allow_redirects=False)
+                if response.status_code < 500:
+                    return
+                self.logger.warning(f"Callback for job {job['job_id']} returned {response.status_code}")
+            except requests.exceptions.RequestException as e:
+                self.logger.warning(f"Callback for job {job['job_id']} failed: {e}")
+            time.sleep(2 ** attempt)
+        self.logger.error(f"Gave up notifying {job['callback_url']} about job {job['job_id']}")
+
+    def callback_allowed(self, url):
+        """Whether an http(s) URL's host, or host:port, is one of callback_hosts"""
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return False
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return False
+        return parts.hostname in self.callback_hosts or f"{parts.hostname}:{port}" in self.callback_hosts
+
+    def _queued(self):
+        """Number of jobs waiting for a worker. Called with the lock held."""
+        return sum(1 for job in self.jobs.values() if job["status"] == "queued")
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job
+
+    def expire_jobs(self):
+        """Forget jobs that finished more than ttl_seconds ago"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for job_id in [
+                job_id for job_id, job in self.jobs.items()
+                if job["finished_at"] is not None and job["finished_at"] < cutoff
+            ]:
+                del self.jobs[job_id]
+
+    @staticmethod
+    def public_status(job):
+        return {
+            key: job[key]
+            for key in ("job_id", "file", "status", "error", "created_at", "started_at", "finished_at")
+        }
+
+    def run(self, **kwargs):
+        uvicorn.run(self.app, **kwargs)
+
+
+if __name__ == "__main__":
+    JobService().run(port=int(os.getenv("PHASE1_SERVICE_PORT", "5050")), host="0.0.0.0")
@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Pipeline stages in order. A document's stage is the last one it completed.
+STAGES = ("ocr", "extraction", "validation")
+
+
+class BatchLedger:
+    """
+    Per-document progress of a batch run, so an interrupted run resumes where it stopped.
+
+    Each document's row holds the last completed stage, the OCR markdown and the record built
+    so far, keyed by path and invalidated when the file content changes.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "ledger.sqlite3")
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                file TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                stage TEXT,
+                ocr_text TEXT,
+                record TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def load(self, file_path, content_hash):
+        """
+        Returns:
+            Tuple of (last completed stage, saved record, OCR markdown), all None if the document
+            was not started or its content changed since
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, stage, record, ocr_text FROM documents WHERE file = ?", (file_path,)
+            ).fetchone()
+        if row is None or row[0] != content_hash or row[1] is None:
+            return None, None, None
+        return row[1], json.loads(row[2]), row[3]
+
+    def save_stage(self, file_path, content_hash, stage, record, ocr_text=None):
+        """Mark a stage as completed. The OCR markdown is kept from earlier stages unless given."""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO documents (file, content_hash, stage, ocr_text, record, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, NULL, ?)
+                ON CONFLICT (file) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    stage = excluded.stage,
+                    ocr_text = COALESCE(excluded.ocr_text, documents.ocr_text),
+                    record = excluded.record,
+                    error = NULL,
+                    updated_at = excluded.updated_at
+                """,
+                (file_path, content_hash, stage, ocr_text, json.dumps(record, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def save_error(self, file_path, content_hash, error):
+        """Record a failed attempt; the completed stages are kept for the next run"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO documents (file, content_hash, error, attempts, updated_at)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT (file) DO UPDATE SET
+                    stage = CASE WHEN documents.content_hash = excluded.content_hash THEN documents.stage END,
+                    content_hash = excluded.content_hash,
+                    error = excluded.error,
+                    attempts = documents.attempts + 1,
+                    updated_at = excluded.updated_at
+                """,
+                (file_path, content_hash, error, time.time()),
+            )
+            self._conn.commit()
+
+    def progress(self):
+        """
+        Returns:
+            Dictionary with the number of documents per last completed stage ("pending" if none),
+            the number of documents whose last attempt failed, and the time of the last update
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT COALESCE(stage, 'pending'), COUNT(*), SUM(error IS NOT NULL), MAX(updated_at) "
+                "FROM documents GROUP BY 1"
+            ).fetchall()
+        stages = {stage: 0 for stage in ("pending",) + STAGES}
+        stages.update({stage: count for stage, count, _, _ in rows})
+        return {
+            "total": sum(stages.values()),
+            "stages": stages,
+            "failed": sum(failed or 0 for _, _, failed, _ in rows),
+            "last_update": max((updated for _, _, _, updated in rows), default=None),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
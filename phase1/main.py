@@ -2,6 +2,8 @@ import logging
 import os
 import subprocess
 import sys
+import threading
+from job_service import JobService
 
 # Configure root logger
 logging.basicConfig(
@@ -33,11 +35,22 @@ def run_streamlit(title):
         logging.error(f"Error occurred while running command: {e}")
 
 
-def run_app(title):
+# Function to run the job service the UI submits forms to
+def run_server(service):
+    logger.info("Job service started")
+    service.run(port=int(os.getenv("PHASE1_SERVICE_PORT", "5050")), host="0.0.0.0")
+
+
+def run_app(service, title):
+    # Start the job service in a separate thread
+    service_thread = threading.Thread(target=run_server, args=(service,))
+    service_thread.daemon = True  # Exits with the main program
+    service_thread.start()
+
     # Start Streamlit app
     run_streamlit(title)
 
 
 if __name__ == "__main__":
     app_title = "ביטוח לאומי Form Processor"
-    run_app(app_title)
+    run_app(JobService(), app_title)
@@ -0,0 +1,123 @@
+import re
+
+# Labels of the form's fields, in Hebrew and English, matched ignoring spacing and punctuation
+# (the OCR writes "ת. ז." for "ת.ז"). They anchor the form's field regions, and lines repeated
+# across pages are only dropped when they carry none of them.
+FIELD_KEYWORDS = [
+    "שם משפחה", "שם פרטי", "ת.ז", "ת\"ז", "מספר זהות", "מין", "זכר", "נקבה", "תאריך לידה",
+    "יום", "חודש", "שנה",
+    "כתובת", "רחוב", "מספר בית", "כניסה", "דירה", "ישוב", "יישוב", "מיקוד", "תא דואר",
+    "טלפון", "נייד", "סוג העבודה", "תאריך הפגיעה", "שעת הפגיעה", "מקום התאונה", "מקום הפגיעה",
+    "נסיבות הפגיעה", "תיאור התאונה", "האיבר שנפגע", "חתימה", "שם המבקש", "תאריך מילוי", "תאריך קבלת",
+    "המוסד הרפואי", "קופת חולים", "כללית", "מאוחדת", "מכבי", "לאומית", "מהות התאונה", "אבחנות",
+    "last name", "first name", "id number", "gender", "date of birth", "address", "street",
+    "postal code", "phone", "mobile", "job", "date of injury", "time of injury", "accident",
+    "injured body part", "signature", "health fund", "diagnos",
+]
+
+# Lines that never carry field values: page furniture emitted by Document Intelligence
+# and the form's printed filling instructions. The declaration is kept, as the applicant's
+# name and signature are written next to it.
+BOILERPLATE_PATTERNS = [
+    re.compile(r"^<!--\s*Page(Header|Footer|Number|Break)\b.*-->$"),
+    re.compile(r"^<figure>.*</figure>$"),
+    re.compile(r"הנחיות|לתשומת לב|יש למלא|נא למלא|למילוי הטופס"),
+    re.compile(r"www\.|btl\.gov\.il|\*6050"),
+]
+
+HEADING_REGEX = re.compile(r"^#{1,6}\s")
+
+# Blocks kept on either side of a labelled block. The OCR often prints a value a couple of
+# blocks before or after its label, so a field region extends this far past its labels;
+# longer label-free stretches (instruction pages, appendices) fall outside every region.
+REGION_MARGIN = 3
+_LABEL_NOISE = re.compile(r"[\s.,:;'\"׳״\-_/]+")
+
+
+def _normalize(text):
+    return _LABEL_NOISE.sub("", text.lower())
+
+
+_KEYWORDS_NORMALIZED = [_normalize(keyword) for keyword in FIELD_KEYWORDS]
+
+
+def estimate_tokens(text):
+    """Rough token estimate (about four characters per token), good enough for relative comparisons"""
+    return (len(text) + 3) // 4
+
+
+def split_blocks(markdown):
+    """Split OCR markdown into blocks at blank lines and headings, keeping each HTML table whole"""
+    blocks = []
+    current = []
+    in_table = False
+
+    for line in markdown.splitlines():
+        stripped = line.strip()
+        if "<table" in stripped:
+            in_table = True
+        if not in_table and (not stripped or HEADING_REGEX.match(stripped)):
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            if not stripped:
+                continue
+        current.append(line)
+        if "</table>" in stripped:
+            in_table = False
+
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def _is_boilerplate(line):
+    return any(pattern.search(line) for pattern in BOILERPLATE_PATTERNS)
+
+
+def _has_field_label(block):
+    block = _normalize(block)
+    return any(keyword in block for keyword in _KEYWORDS_NORMALIZED)
+
+
+def condense_markdown(markdown):
+    """
+    Keep the form's field regions of OCR markdown: the blocks within REGION_MARGIN blocks of
+    a field label, after dropping page furniture, printed instructions and repeated lines.
+
+    Returns:
+        Tuple of (condensed markdown, number of blocks kept, total number of blocks).
+        If no field label is found, the original markdown is returned unchanged.
+    """
+    lines = markdown.splitlines()
+    total = len(split_blocks(markdown))
+    if not _has_field_label(markdown):
+        return markdown, total, total
+
+    # Text lines repeated on several pages (running headers, footers) are boilerplate as well
+    counts = {}
+    for line in lines:
+        stripped = line.strip()
+        if len(stripped) >= 10 and not stripped.startswith("<"):
+            counts[stripped] = counts.get(stripped, 0) + 1
+    repeated = {line for line, count in counts.items() if count > 2 and not _has_field_label(line)}
+
+    # Table markup is left intact so rows stay aligned with their labels
+    cleaned = []
+    in_table = False
+    for line in lines:
+        stripped = line.strip()
+        if "<table" in stripped:
+            in_table = True
+        if in_table or not (stripped in repeated or _is_boilerplate(stripped)):
+            cleaned.append(line)
+        if "</table>" in stripped:
+            in_table = False
+
+    blocks = split_blocks("\n".join(cleaned))
+    labelled = [i for i, block in enumerate(blocks) if _has_field_label(block)]
+    kept = [
+        block for i, block in enumerate(blocks)
+        if any(abs(i - j) <= REGION_MARGIN for j in labelled)
+    ]
+    return "\n\n".join(kept), len(kept), total
@@ -1,22 +1,54 @@
 import os
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeDocumentRequest, DocumentContentFormat
+import asyncio
+import contextvars
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import tempfile
+from result_cache import make_key, hash_file, hash_stream
+from common.governor import get_governor, INTERACTIVE
 
 load_dotenv()
 
+OCR_MODEL_ID = "prebuilt-layout"
+PAGE_BREAK = "\n\n<!-- PageBreak -->\n\n"
+
 class OCRProcessor:
-    def __init__(self):
+    def __init__(self, max_in_flight=None, cache=None, priority=INTERACTIVE):
+        # The Azure SDK is imported lazily so importing this module stays cheap
+        from azure.core.credentials import AzureKeyCredential
+        from azure.ai.documentintelligence import DocumentIntelligenceClient
+
         # Initialize Document Intelligence client
-        endpoint = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT")
-        key = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_KEY")
+        self.endpoint = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT")
+        self.key = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_KEY")
         
         self.client = DocumentIntelligenceClient(
-            endpoint=endpoint, 
-            credential=AzureKeyCredential(key)
+            endpoint=self.endpoint, 
+            credential=AzureKeyCredential(self.key)
+        )
+
+        # Settings for concurrent analysis (process_documents_md)
+        self.max_in_flight = max_in_flight or int(
+            os.getenv("AZURE_DOCUMENT_INTELLIGENCE_MAX_IN_FLIGHT", "8")
         )
+        self.min_polling_interval = 1.0
+        self.max_polling_interval = 15.0
+        # Moving average of analysis duration, used to adapt the polling interval
+        self._average_duration = None
+
+        # Optional ResultCache keyed by file content
+        self.cache = cache
+
+        # Analysis requests share the resource's rate limits with the rest of the process
+        self.governor = get_governor("document-intelligence")
+        self.priority = priority
+
+        # Page range holding the actual form (e.g. "1-2"); trailing attachments are not analyzed or billed
+        self.form_pages = os.getenv("PHASE1_FORM_PAGES") or None
     
     def process_document(self, file_path):
         with open(file_path, "rb") as f:
@@ -33,18 +65,242 @@ class OCRProcessor:
         
         return result
     
-    def process_document_md(self, file_path):
-        with open(file_path, "rb") as f:
-            file_content = f.read()
-            poller = self.client.begin_analyze_document(
-                "prebuilt-layout", 
-                body=file_content,
-                output_content_format=DocumentContentFormat.MARKDOWN
+    def process_document_md(self, document, pages=None):
+        """
+        Analyze a document and return its content as markdown
+        
+        Args:
+            document: Path to the document, or a seekable binary file-like object (e.g. a Streamlit upload)
+            pages: Optional 1-based page range to analyze, e.g. "1-3,5". Defaults to PHASE1_FORM_PAGES
+            
+        Returns:
+            Markdown content of the document
+        """
+        pages = pages or self.form_pages
+        cache_key = self._cache_key(document, pages)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        from azure.ai.documentintelligence.models import DocumentContentFormat
+
+        # The stream is passed as the request body, so the file is never copied into memory here
+        with _open_document(document) as stream:
+            poller = self.governor.call(
+                self._begin_analyze,
+                stream,
+                pages=pages,
+                output_content_format=DocumentContentFormat.MARKDOWN,
+                priority=self.priority,
             )
-        result = poller.result()
+            result = poller.result()
+
+        if cache_key:
+            self.cache.set(cache_key, result.content)
         
         return result.content
-    
+
+    def process_document_md_parallel(self, document, pages_per_chunk=4, max_workers=4, pages=None):
+        """
+        Split a PDF locally into page ranges, analyze them concurrently and reassemble the markdown in order.
+        Non-PDF documents and PDFs that fit in a single chunk are analyzed in one request.
+        
+        Args:
+            document: Path to the document, or a seekable binary file-like object
+            pages_per_chunk: Number of pages sent in each analysis request
+            max_workers: Maximum number of chunks analyzed at the same time
+            pages: Optional 1-based page range to analyze, e.g. "1-3,5". Defaults to PHASE1_FORM_PAGES
+            
+        Returns:
+            Markdown content of the selected pages
+        """
+        pages = pages or self.form_pages
+        cache_key = self._cache_key(document, pages)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        with _open_document(document) as stream:
+            if stream.read(5) != b"%PDF-":
+                return self.process_document_md(document, pages=pages)
+
+            from pypdf import PdfReader
+
+            reader = PdfReader(stream)
+            page_numbers = _parse_pages(pages, len(reader.pages))
+            if len(page_numbers) <= pages_per_chunk:
+                return self.process_document_md(document, pages=pages)
+
+            chunks = [
+                page_numbers[i:i + pages_per_chunk]
+                for i in range(0, len(page_numbers), pages_per_chunk)
+            ]
+            # The reader is not thread-safe, so chunks are written one at a time and only the upload runs in parallel.
+            # Each chunk is written just before it's submitted, so only the chunks in flight are held in memory.
+            # Each chunk runs in a copy of this context, so its stages count towards a profiled request
+            reader_lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self._analyze_pages, reader, reader_lock, chunk)
+                    for chunk in chunks
+                ]
+                contents = [future.result() for future in futures]
+
+        content = PAGE_BREAK.join(contents)
+        if cache_key:
+            self.cache.set(cache_key, content)
+
+        return content
+
+    def _analyze_pages(self, reader, reader_lock, page_numbers):
+        from pypdf import PdfWriter
+        from azure.ai.documentintelligence.models import DocumentContentFormat
+
+        chunk = io.BytesIO()
+        with reader_lock:
+            writer = PdfWriter()
+            for page_number in page_numbers:
+                writer.add_page(reader.pages[page_number - 1])
+            writer.write(chunk)
+        chunk.seek(0)
+
+        poller = self.governor.call(
+            self._begin_analyze,
+            chunk,
+            output_content_format=DocumentContentFormat.MARKDOWN,
+            priority=self.priority,
+        )
+        return poller.result().content
+
+    def _begin_analyze(self, stream, **kwargs):
+        # Rewind first, so a throttled request is retried with the whole document
+        stream.seek(0)
+        return self.client.begin_analyze_document(OCR_MODEL_ID, body=stream, **kwargs)
+
+    def _cache_key(self, document, pages=None):
+        if self.cache is None:
+            return None
+        from azure.ai.documentintelligence import __version__ as sdk_version
+
+        if isinstance(document, (str, os.PathLike)):
+            content_hash = hash_file(document)
+        else:
+            content_hash = hash_stream(document)
+        return make_key("ocr", OCR_MODEL_ID, "markdown", sdk_version, pages or "all", content_hash)
+
+    def process_documents_md(self, file_paths, return_exceptions=True):
+        """
+        Analyze many documents concurrently without holding a thread per document
+        
+        Args:
+            file_paths: List of document paths
+            return_exceptions: If True, a failed document yields its exception instead of aborting the batch
+            
+        Returns:
+            List of markdown strings (or exceptions), in the same order as file_paths
+        """
+        return asyncio.run(
+            self.process_documents_md_async(file_paths, return_exceptions=return_exceptions)
+        )
+
+    async def process_documents_md_async(self, file_paths, return_exceptions=True):
+        """
+        Async version of process_documents_md for callers that already run an event loop.
+        At most max_in_flight analyses are submitted or polled at the same time.
+        """
+        from azure.core.credentials import AzureKeyCredential
+        from azure.ai.documentintelligence.aio import DocumentIntelligenceClient as AsyncDocumentIntelligenceClient
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with AsyncDocumentIntelligenceClient(
+            endpoint=self.endpoint,
+            credential=AzureKeyCredential(self.key)
+        ) as client:
+            tasks = [
+                self._analyze_document_md_async(client, semaphore, file_path)
+                for file_path in file_paths
+            ]
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+    async def _analyze_document_md_async(self, client, semaphore, file_path):
+        cache_key = self._cache_key(file_path, self.form_pages)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        async with semaphore:
+            with _open_document(file_path) as stream:
+                start_time = time.time()
+                poller = await self._begin_analyze_with_backoff(client, stream)
+                result = await poller.result()
+                self._record_duration(time.time() - start_time)
+
+        if cache_key:
+            self.cache.set(cache_key, result.content)
+
+        return result.content
+
+    async def _begin_analyze_with_backoff(self, client, stream):
+        from azure.ai.documentintelligence.models import DocumentContentFormat
+
+        # The SDK already retries throttled requests a few times; once those are exhausted,
+        # the governor backs off according to the service's Retry-After before submitting again
+        async def begin_analyze():
+            stream.seek(0)
+            return await client.begin_analyze_document(
+                OCR_MODEL_ID,
+                body=stream,
+                pages=self.form_pages,
+                output_content_format=DocumentContentFormat.MARKDOWN,
+                polling_interval=self._polling_interval(),
+            )
+
+        return await self.governor.call_async(begin_analyze, priority=self.priority)
+
+    def _polling_interval(self):
+        # Poll roughly four times over an average analysis, within fixed bounds
+        if self._average_duration is None:
+            return self.min_polling_interval
+        return min(max(self._average_duration / 4, self.min_polling_interval), self.max_polling_interval)
+
+    def _record_duration(self, duration):
+        if self._average_duration is None:
+            self._average_duration = duration
+        else:
+            self._average_duration = 0.8 * self._average_duration + 0.2 * duration
+
+
+def _parse_pages(pages, page_count):
+    """Expand a page range such as "1-3,5" into sorted 1-based page numbers within the document"""
+    if not pages:
+        return list(range(1, page_count + 1))
+
+    page_numbers = set()
+    for part in pages.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-", 1)
+            page_numbers.update(range(int(first), int(last) + 1))
+        elif part:
+            page_numbers.add(int(part))
+
+    return sorted(page for page in page_numbers if 1 <= page <= page_count)
+
+
+@contextmanager
+def _open_document(document):
+    """Yield a binary stream for a path or an already open file-like object"""
+    if isinstance(document, (str, os.PathLike)):
+        with open(document, "rb") as f:
+            yield f
+    else:
+        document.seek(0)
+        yield document
+
+
 def save_to_file(text, file_path, file_format="txt", suffix="_extracted"):   
     # Get directory and filename components from original file
     directory = os.path.dirname(file_path)
@@ -0,0 +1,486 @@
+"""
+Offline extraction mode for large backlogs of forms.
+
+    python phase1/offline_batch.py data/phase1_data --work-dir backlog_job -o results.jsonl
+
+Documents are OCRed up front and their extraction requests are written to a JSONL job file,
+which is submitted through the Azure OpenAI Batch API (or run locally with --local). Progress
+is checkpointed in the work directory, so an interrupted or --no-wait run is continued by
+running the same command again:
+    ledger.sqlite3   per-document stages (OCR text, final record), the same BatchLedger that
+                     batch.py --work-dir uses, so either tool reuses the other's OCR and results
+    state.json       the batch job itself: which documents wait for submission, the submitted
+                     batches and the rule-extracted values of each request
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Make the project root importable, for the validation rules shared with phase2
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from batch import collect_files, build_summary
+from pipeline import FormPipeline
+from ledger import BatchLedger, STAGES
+from openai_processor import OUTPUT_SCHEMA, schema_paths, subset_schema
+from result_cache import ResultCache, hash_file
+from common.governor import get_governor, estimate_tokens, BATCH
+
+logger = logging.getLogger(__name__)
+
+# Batch statuses after which no more results will arrive
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class OpenAIBatchBackend:
+    """
+    Azure OpenAI Batch API. Requires a global batch deployment; results arrive within the
+    completion window at a lower price than regular calls.
+    """
+
+    def __init__(self, client, completion_window="24h"):
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, job_path):
+        with open(job_path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint="/chat/completions",
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        return self.client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id):
+        """Output and error lines of a finished batch, each with custom_id, response and error"""
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = self.client.files.content(file_id).text
+                lines.extend(json.loads(line) for line in content.splitlines() if line.strip())
+        return lines
+
+
+class LocalBatchBackend:
+    """
+    Runs a job file with regular chat completion calls and writes results in the Batch API
+    output format. Requests are run when the batch is polled, and answered requests are not
+    sent again if a run is interrupted.
+    """
+
+    def __init__(self, client, directory, max_workers=4):
+        self.client = client
+        self.directory = directory
+        self.max_workers = max_workers
+        os.makedirs(directory, exist_ok=True)
+
+    def submit(self, job_path):
+        batch_id = f"local-{hash_file(job_path)[:16]}"
+        shutil.copyfile(job_path, self._path(batch_id, "input"))
+        return batch_id
+
+    def status(self, batch_id):
+        done = {line["custom_id"] for line in self.results(batch_id)}
+        requests = [r for r in self._read(self._path(batch_id, "input")) if r["custom_id"] not in done]
+
+        with open(self._path(batch_id, "output"), "a", encoding="utf-8") as output_file, ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            futures = [executor.submit(self._execute, request) for request in requests]
+            for future in as_completed(futures):
+                output_file.write(json.dumps(future.result(), ensure_ascii=False) + "\n")
+                output_file.flush()
+
+        return "completed"
+
+    def results(self, batch_id):
+        return self._read(self._path(batch_id, "output"))
+
+    def _execute(self, request):
+        try:
+            body = request["body"]
+            response = get_governor(body["model"]).call(
+                self.client.chat.completions.create,
+                **body,
+                priority=BATCH,
+                tokens=estimate_tokens(body["messages"]),
+            )
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+        return {
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": response.model_dump()},
+            "error": None,
+        }
+
+    def _path(self, batch_id, kind):
+        return os.path.join(self.directory, f"{batch_id}.{kind}.jsonl")
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class OfflineExtractionJob:
+    """
+    Checkpointed offline extraction of a set of documents.
+
+    Every document moves through the statuses queued (OCR done, waiting for submission),
+    submitted and done, or failed. Failed documents are retried on the next run, and
+    documents missing from the results of a failed or expired batch are queued again.
+    """
+
+    def __init__(self, work_dir, pipeline, backend, deployment=None, max_workers=4):
+        self.work_dir = work_dir
+        self.pipeline = pipeline
+        self.backend = backend
+        self.deployment = deployment or pipeline.ai.deployment_name
+        self.max_workers = max_workers
+
+        self.ledger = BatchLedger(work_dir)
+        self.state_path = os.path.join(work_dir, "state.json")
+
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        else:
+            self.state = {"documents": {}, "batches": {}}
+
+    def run(self, files, output_path, poll_interval=60, wait=True):
+        """
+        Prepare, submit and (if wait is set) wait for and collect all documents.
+        The records of finished documents are written to output_path as JSONL.
+
+        Returns:
+            List of per-document records of the finished documents
+        """
+        self.prepare(files)
+        self.submit()
+        if wait:
+            self.wait(poll_interval)
+        self.collect()
+        return self.write_results(files, output_path)
+
+    def prepare(self, files):
+        """Run the rule extractor on new and previously failed documents, OCRing those not OCRed yet"""
+        documents = self.state["documents"]
+        pending = [path for path in files if documents.get(path, {}).get("status", "failed") == "failed"]
+        for path in pending:
+            documents.setdefault(path, {"id": f"doc-{len(documents) + 1:05d}"})
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._prepare_document, path): path for path in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path = futures[future]
+                documents[path].update(future.result())
+                self._save_state()
+                logger.info(f"[{done}/{len(pending)}] {path}: {documents[path]['status']}")
+
+    def submit(self):
+        """
+        Write the extraction requests of all queued documents to a job file and submit it
+
+        Returns:
+            The batch ID, or None if there was nothing to submit
+        """
+        queued = [(path, doc) for path, doc in self.state["documents"].items() if doc["status"] == "queued"]
+        requests = []
+        for path, doc in queued:
+            text, schema = self._request_input(path, doc)
+
+            # Extractions already answered by earlier runs are not paid for twice
+            cache = self.pipeline.ai.cache
+            cached = cache.get(self.pipeline.ai.cache_key(text, schema)) if cache is not None else None
+            if cached is not None:
+                self._finish(path, doc, json.loads(cached))
+                continue
+
+            messages, doc["prompt_stats"] = self.pipeline.ai.build_messages(text, schema)
+            requests.append({
+                "custom_id": doc["id"],
+                "method": "POST",
+                "url": "/chat/completions",
+                "body": {
+                    "model": self.deployment,
+                    "messages": messages,
+                    "temperature": 0,
+                    "response_format": {"type": "json_object"},
+                },
+            })
+
+        if not requests:
+            self._save_state()
+            return None
+
+        job_path = os.path.join(self.work_dir, f"requests-{len(self.state['batches']) + 1:03d}.jsonl")
+        with open(job_path, "w", encoding="utf-8") as f:
+            for request in requests:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+        batch_id = self.backend.submit(job_path)
+        self.state["batches"][batch_id] = {"status": "submitted", "job_file": job_path, "collected": False}
+        submitted = {request["custom_id"] for request in requests}
+        for path, doc in queued:
+            if doc["id"] in submitted:
+                doc["status"] = "submitted"
+                doc["batch_id"] = batch_id
+        self._save_state()
+
+        logger.info(f"Submitted {len(requests)} extraction requests as batch {batch_id}")
+        return batch_id
+
+    def wait(self, poll_interval=60):
+        """Poll the open batches until all of them reached a terminal status"""
+        while True:
+            open_batches = [
+                batch_id for batch_id, batch in self.state["batches"].items()
+                if batch["status"] not in TERMINAL_STATUSES
+            ]
+            if not open_batches:
+                return
+
+            for batch_id in open_batches:
+                self.state["batches"][batch_id]["status"] = self.backend.status(batch_id)
+            self._save_state()
+
+            still_open = [
+                batch_id for batch_id in open_batches
+                if self.state["batches"][batch_id]["status"] not in TERMINAL_STATUSES
+            ]
+            if still_open:
+                logger.info(f"Waiting for {len(still_open)} batches, next check in {poll_interval}s")
+                time.sleep(poll_interval)
+
+    def collect(self):
+        """Map the results of finished batches back to their documents"""
+        for batch_id, batch in self.state["batches"].items():
+            if batch["status"] not in TERMINAL_STATUSES or batch["collected"]:
+                continue
+
+            submitted = {
+                doc["id"]: (path, doc) for path, doc in self.state["documents"].items()
+                if doc["status"] == "submitted" and doc.get("batch_id") == batch_id
+            }
+            for line in self.backend.results(batch_id):
+                entry = submitted.pop(line["custom_id"], None)
+                if entry is None:
+                    continue
+                path, doc = entry
+                self._finish_from_response(path, doc, line)
+
+            # Requests a failed or expired batch did not answer go into the next job file
+            for path, doc in submitted.values():
+                doc["status"] = "queued"
+                doc.pop("batch_id", None)
+
+            batch["collected"] = True
+            self._save_state()
+            logger.info(f"Collected batch {batch_id} ({batch['status']}), {len(submitted)} requests requeued")
+
+    def write_results(self, files, output_path):
+        records = [
+            self.state["documents"][path]["record"] for path in files
+            if self.state["documents"].get(path, {}).get("record")
+        ]
+        with open(output_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return records
+
+    def _prepare_document(self, path):
+        """
+        OCR a document and run the rule extractor. Runs in a worker thread, returns the state updates.
+        OCR text and finished records already in the ledger (from an earlier run of either tool)
+        are reused.
+        """
+        doc = self.state["documents"][path]
+        updates = {"record": None, "prompt_stats": None}
+        try:
+            updates["content_hash"] = hash_file(path)
+            saved_stage, saved_record, text = self.ledger.load(path, updates["content_hash"])
+            if saved_stage == STAGES[-1] and saved_record["status"] == "ok":
+                return dict(updates, status="done", record=saved_record)
+            if text is None:
+                record = self.pipeline.new_record(path)
+                start_time = time.time()
+                text = self.pipeline.run_ocr(path)
+                record["timings"]["ocr"] = time.time() - start_time
+                self.ledger.save_stage(path, updates["content_hash"], "ocr", record, ocr_text=text)
+                saved_record = record
+            updates["ocr_seconds"] = saved_record["timings"].get("ocr", 0.0)
+
+            complete, updates["rule_values"] = self.pipeline.pre_extract(text)
+        except Exception as e:
+            record = self.pipeline.new_record(path)
+            record["status"] = "error"
+            record["error"] = str(e)
+            return dict(updates, status="failed", record=record)
+
+        if complete is None:
+            return dict(updates, status="queued")
+
+        record = self._new_record(path, dict(doc, **updates))
+        record["llm_skipped"] = True
+        self.pipeline.validate_into(record, complete)
+        self.ledger.save_stage(path, updates["content_hash"], STAGES[-1], record)
+        return dict(updates, status="done", record=record)
+
+    def _request_input(self, path, doc):
+        """OCR text and schema of the fields the LLM is asked for"""
+        _, _, text = self.ledger.load(path, doc["content_hash"])
+        if text is None:
+            raise ValueError(f"No OCR text of {path} in {self.ledger.path}, was the file changed?")
+        remaining = [field for field in schema_paths(OUTPUT_SCHEMA) if field not in doc["rule_values"]]
+        return text, subset_schema(remaining) if doc["rule_values"] else None
+
+    def _finish_from_response(self, path, doc, line):
+        response = line.get("response") or {}
+        error = line.get("error")
+        if not error and response.get("status_code") != 200:
+            error = (response.get("body") or {}).get("error") or f"HTTP {response.get('status_code')}"
+
+        if not error:
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+                extracted_data = json.loads(content)
+            except (KeyError, IndexError, TypeError, json.JSONDecodeError) as e:
+                error = f"Invalid batch response: {e}"
+
+        if error:
+            record = self._new_record(path, doc)
+            record["status"] = "error"
+            record["error"] = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            doc["status"] = "failed"
+            doc["record"] = record
+            return
+
+        cache = self.pipeline.ai.cache
+        if cache is not None:
+            text, schema = self._request_input(path, doc)
+            cache.set(self.pipeline.ai.cache_key(text, schema), json.dumps(extracted_data, ensure_ascii=False))
+        self._finish(path, doc, extracted_data)
+
+    def _finish(self, path, doc, extracted_data):
+        record = self._new_record(path, doc)
+        try:
+            self.pipeline.validate_into(record, self.pipeline.combine(extracted_data, doc["rule_values"]))
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+        doc["status"] = "done" if record["status"] == "ok" else "failed"
+        doc["record"] = record
+        if doc["status"] == "done":
+            self.ledger.save_stage(path, doc["content_hash"], STAGES[-1], record)
+        else:
+            self.ledger.save_error(path, doc["content_hash"], record["error"])
+
+    def _new_record(self, path, doc):
+        record = self.pipeline.new_record(path)
+        record["timings"]["ocr"] = doc["ocr_seconds"]
+        record["prompt_stats"] = doc.get("prompt_stats")
+        record["rule_fields"] = sorted(doc["rule_values"])
+        return record
+
+    def _save_state(self):
+        # Write to a temporary file first, so an interrupted save never corrupts the checkpoint
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline batch extraction of ביטוח לאומי forms")
+    parser.add_argument(
+        "inputs", nargs="+", help="Files, directories or glob patterns of PDF/JPG forms"
+    )
+    parser.add_argument(
+        "--work-dir", required=True, help="Directory for the job files, ledger and checkpoint"
+    )
+    parser.add_argument(
+        "-o", "--output", default="batch_results.jsonl", help="Path of the JSONL results file"
+    )
+    parser.add_argument(
+        "--summary", default=None, help="Path of the summary report (default: <output>.summary.json)"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=4, help="Maximum number of documents OCRed concurrently"
+    )
+    parser.add_argument(
+        "--cache-dir", default=None, help="Reuse OCR/extraction results stored in this directory"
+    )
+    parser.add_argument(
+        "--pages-per-chunk",
+        type=int,
+        default=None,
+        help="Split long PDFs into chunks of this many pages and analyze them concurrently",
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Run the job file with regular chat completion calls instead of the Batch API",
+    )
+    parser.add_argument(
+        "--poll-interval", type=int, default=60, help="Seconds between batch status checks"
+    )
+    parser.add_argument(
+        "--no-wait", action="store_true", help="Exit after submitting; run again later to collect"
+    )
+    args = parser.parse_args()
+
+    files = collect_files(args.inputs)
+    if not files:
+        logger.error("No PDF/JPG files found")
+        sys.exit(1)
+
+    cache = ResultCache(args.cache_dir) if args.cache_dir else None
+    pipeline = FormPipeline(cache=cache, pages_per_chunk=args.pages_per_chunk, priority=BATCH)
+    if args.local:
+        backend = LocalBatchBackend(
+            pipeline.ai.client, os.path.join(args.work_dir, "local"), max_workers=args.workers
+        )
+        deployment = pipeline.ai.deployment_name
+    else:
+        backend = OpenAIBatchBackend(pipeline.ai.client)
+        deployment = os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT") or pipeline.ai.deployment_name
+
+    job = OfflineExtractionJob(
+        args.work_dir, pipeline, backend, deployment=deployment, max_workers=args.workers
+    )
+    start_time = time.time()
+    records = job.run(files, args.output, poll_interval=args.poll_interval, wait=not args.no_wait)
+    elapsed = time.time() - start_time
+
+    summary = build_summary(records, elapsed)
+    summary_path = args.summary or f"{os.path.splitext(args.output)[0]}.summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    pending = len(files) - len(records)
+    logger.info(
+        f"Done: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+        f"{pending} still waiting for their batch"
+    )
+    logger.info(f"Results written to {args.output}, summary to {summary_path}")
+
+
+if __name__ == "__main__":
+    # Configure root logger; not left to the configuration done when importing batch
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    main()
@@ -1,12 +1,185 @@
 import os
+import copy
+import contextvars
 import json
-from openai import AzureOpenAI
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from result_cache import make_key, hash_text
+from markdown_filter import condense_markdown, estimate_tokens
+from common.governor import get_governor, estimate_tokens as estimate_request_tokens, INTERACTIVE
 
 load_dotenv()
 
+# Output schema for the model
+OUTPUT_SCHEMA = {
+    "lastName": "",
+    "firstName": "",
+    "idNumber": "",
+    "gender": "",
+    "dateOfBirth": {
+        "day": "",
+        "month": "",
+        "year": ""
+    },
+    "address": {
+        "street": "",
+        "houseNumber": "",
+        "entrance": "",
+        "apartment": "",
+        "city": "",
+        "postalCode": "",
+        "poBox": ""
+    },
+    "landlinePhone": "",
+    "mobilePhone": "",
+    "jobType": "",
+    "dateOfInjury": {
+        "day": "",
+        "month": "",
+        "year": ""
+    },
+    "timeOfInjury": "",
+    "accidentLocation": "",
+    "accidentAddress": "",
+    "accidentDescription": "",
+    "injuredBodyPart": "",
+    "signature": "",
+    "formFillingDate": {
+        "day": "",
+        "month": "",
+        "year": ""
+    },
+    "formReceiptDateAtClinic": {
+        "day": "",
+        "month": "",
+        "year": ""
+    },
+    "medicalInstitutionFields": {
+        "healthFundMember": "",
+        "natureOfAccident": "",
+        "medicalDiagnoses": ""
+    }
+}
+
+SYSTEM_PROMPT = """
+You are tasked with extracting information from ביטוח לאומי (National Insurance Institute) forms.
+You will be given OCR text from a form that may be in Hebrew, English, or mixed.
+Extract all relevant fields according to the output schema.
+For any fields that aren't present or can't be determined, use an empty string.
+The form may have fields related to personal information, accident details, and medical information.
+Return your response in valid JSON format exactly matching the output schema.
+"""
+
+# The schema as sent in the full prompt, the baseline for prompt statistics
+SCHEMA_JSON_INDENTED = json.dumps(OUTPUT_SCHEMA, indent=2, ensure_ascii=False)
+
+# Changes to the schema or prompt invalidate cached extractions
+SCHEMA_VERSION = hash_text(
+    json.dumps(OUTPUT_SCHEMA, sort_keys=True, ensure_ascii=False) + SYSTEM_PROMPT
+)[:12]
+
+
+# Independent groups of top-level fields, extracted in parallel calls when enabled
+SCHEMA_GROUPS = {
+    "personal": ["lastName", "firstName", "idNumber", "gender", "dateOfBirth", "landlinePhone", "mobilePhone",
+                 "jobType"],
+    "address": ["address"],
+    "accident": ["dateOfInjury", "timeOfInjury", "accidentLocation", "accidentAddress", "accidentDescription",
+                 "injuredBodyPart"],
+    "medical": ["signature", "formFillingDate", "formReceiptDateAtClinic", "medicalInstitutionFields"],
+}
+
+
+def split_schema(schema, groups=SCHEMA_GROUPS):
+    """
+    Split a schema into the given groups of top-level fields
+    
+    Args:
+        schema: OUTPUT_SCHEMA or a subset of it
+        groups: Dictionary of group name -> top-level field names. Fields in no group form
+            an "other" group.
+    
+    Returns:
+        List of non-empty sub-schemas
+    """
+    grouped = set()
+    parts = []
+    for fields in groups.values():
+        part = {field: schema[field] for field in fields if field in schema}
+        grouped.update(fields)
+        if part:
+            parts.append(part)
+    other = {field: value for field, value in schema.items() if field not in grouped}
+    if other:
+        parts.append(other)
+    return parts
+
+
+def schema_paths(schema, prefix=""):
+    """List the dotted paths of all leaf fields of a schema, e.g. address.city"""
+    paths = []
+    for key, value in schema.items():
+        if isinstance(value, dict):
+            paths.extend(schema_paths(value, f"{prefix}{key}."))
+        else:
+            paths.append(f"{prefix}{key}")
+    return paths
+
+
+def subset_schema(paths):
+    """Build a copy of OUTPUT_SCHEMA containing only the given dotted paths"""
+    schema = {}
+    for path in paths:
+        parts = path.split(".")
+        node = schema
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = ""
+    return schema
+
+
+def flatten_fields(data, prefix=""):
+    """Flatten a nested result into dotted path -> value pairs"""
+    values = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            values.update(flatten_fields(value, f"{prefix}{key}."))
+        else:
+            values[f"{prefix}{key}"] = value
+    return values
+
+
+def merge_fields(result, values):
+    """Write dotted path -> value pairs into a nested result dictionary"""
+    for path, value in values.items():
+        parts = path.split(".")
+        node = result
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        node[parts[-1]] = value
+    return result
+
+
+def build_user_prompt(ocr_text, schema_json):
+    return f"""
+        Here is the OCR text from a ביטוח לאומי form:
+        
+        {ocr_text}
+        
+        Extract the information into the following JSON schema:
+        {schema_json}
+        
+        Return only the JSON output.
+        """
+
+
 class OpenAIProcessor:
-    def __init__(self):
+    def __init__(self, cache=None, condense=None, priority=INTERACTIVE, parallel_groups=None):
+        # The OpenAI SDK is imported lazily so importing this module stays cheap
+        from openai import AzureOpenAI
+
         # Initialize Azure OpenAI client
         self.client = AzureOpenAI(
             azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
@@ -14,6 +187,26 @@ class OpenAIProcessor:
             api_version=os.environ.get("AZURE_OPENAI_API_VERSION")
         )
         self.deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+        self.api_version = os.environ.get("AZURE_OPENAI_API_VERSION")
+
+        # Optional ResultCache keyed by OCR text and deployment/schema versions
+        self.cache = cache
+
+        # Send the OCR text without page furniture and printed instructions, with a compact
+        # schema; defaults to PHASE1_CONDENSE_PROMPT
+        if condense is None:
+            condense = os.getenv("PHASE1_CONDENSE_PROMPT", "").lower() in ("1", "true", "yes")
+        self.condense = condense
+
+        # Calls share the deployment's rate limits with the rest of the process
+        self.governor = get_governor(self.deployment_name)
+        self.priority = priority
+
+        # Extract the schema groups (SCHEMA_GROUPS) in parallel calls instead of one long
+        # generation; defaults to PHASE1_PARALLEL_EXTRACTION
+        if parallel_groups is None:
+            parallel_groups = os.getenv("PHASE1_PARALLEL_EXTRACTION", "").lower() in ("1", "true", "yes")
+        self.parallel_groups = parallel_groups
     
     def extract_fields(self, ocr_result):
         """
@@ -25,97 +218,160 @@ class OpenAIProcessor:
         Returns:
             JSON object with extracted fields
         """
-        # Define the output schema for the model
-        output_schema = {
-            "lastName": "",
-            "firstName": "",
-            "idNumber": "",
-            "gender": "",
-            "dateOfBirth": {
-                "day": "",
-                "month": "",
-                "year": ""
-            },
-            "address": {
-                "street": "",
-                "houseNumber": "",
-                "entrance": "",
-                "apartment": "",
-                "city": "",
-                "postalCode": "",
-                "poBox": ""
-            },
-            "landlinePhone": "",
-            "mobilePhone": "",
-            "jobType": "",
-            "dateOfInjury": {
-                "day": "",
-                "month": "",
-                "year": ""
-            },
-            "timeOfInjury": "",
-            "accidentLocation": "",
-            "accidentAddress": "",
-            "accidentDescription": "",
-            "injuredBodyPart": "",
-            "signature": "",
-            "formFillingDate": {
-                "day": "",
-                "month": "",
-                "year": ""
-            },
-            "formReceiptDateAtClinic": {
-                "day": "",
-                "month": "",
-                "year": ""
-            },
-            "medicalInstitutionFields": {
-                "healthFundMember": "",
-                "natureOfAccident": "",
-                "medicalDiagnoses": ""
-            }
-        }
-        
-        # Create a prompt for the OpenAI model
-        system_prompt = """
-        You are tasked with extracting information from ביטוח לאומי (National Insurance Institute) forms.
-        You will be given OCR text from a form that may be in Hebrew, English, or mixed.
-        Extract all relevant fields according to the output schema.
-        For any fields that aren't present or can't be determined, use an empty string.
-        The form may have fields related to personal information, accident details, and medical information.
-        Return your response in valid JSON format exactly matching the output schema.
+        result_json, _ = self.extract_fields_with_stats(ocr_result)
+        return result_json
+
+    def build_messages(self, ocr_result, schema=None):
         """
+        Build the chat messages for an extraction request
         
-        user_prompt = f"""
-        Here is the OCR text from a ביטוח לאומי form:
-        
-        {ocr_result}
-        
-        Extract the information into the following JSON schema:
-        {json.dumps(output_schema, indent=2, ensure_ascii=False)}
+        Args:
+            ocr_result: Result from Azure Document Intelligence
+            schema: Optional subset of OUTPUT_SCHEMA (see subset_schema) to ask the model for
+            
+        Returns:
+            Tuple of (chat messages, prompt statistics dictionary)
+        """
+        schema = schema or OUTPUT_SCHEMA
+        full_prompt = build_user_prompt(ocr_result, SCHEMA_JSON_INDENTED)
+        if self.condense:
+            condensed_text, blocks_kept, blocks_total = condense_markdown(ocr_result)
+            user_prompt = build_user_prompt(
+                condensed_text, json.dumps(schema, ensure_ascii=False, separators=(",", ":"))
+            )
+        else:
+            blocks_kept = blocks_total = None
+            user_prompt = build_user_prompt(ocr_result, json.dumps(schema, indent=2, ensure_ascii=False))
+
+        original_tokens = estimate_tokens(SYSTEM_PROMPT + full_prompt)
+        prompt_tokens = estimate_tokens(SYSTEM_PROMPT + user_prompt)
+        stats = {
+            "original_tokens": original_tokens,
+            "prompt_tokens": prompt_tokens,
+            "reduction": 1 - prompt_tokens / original_tokens if original_tokens else 0.0,
+            "blocks_kept": blocks_kept,
+            "blocks_total": blocks_total,
+            "completion_tokens": None,
+            "cached": False,
+            "calls": 1,
+        }
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+        return messages, stats
+
+    def cache_key(self, ocr_result, schema=None):
+        """Cache key of an extraction, covering the deployment, schema and prompt mode"""
+        schema = schema or OUTPUT_SCHEMA
+        schema_id = SCHEMA_VERSION if schema is OUTPUT_SCHEMA else hash_text(
+            SCHEMA_VERSION + json.dumps(schema, sort_keys=True)
+        )[:12]
+        return make_key(
+            "extract",
+            self.deployment_name,
+            self.api_version,
+            schema_id,
+            "condensed" if self.condense else "full",
+            hash_text(ocr_result),
+        )
+
+    def extract_fields_with_stats(self, ocr_result, schema=None):
+        """
+        Same as extract_fields, but also reports how much the prompt was reduced
         
-        Return only the JSON output.
+        Args:
+            ocr_result: Result from Azure Document Intelligence
+            schema: Optional subset of OUTPUT_SCHEMA (see subset_schema) to ask the model for
+            
+        Returns:
+            Tuple of (JSON object with extracted fields, prompt statistics dictionary)
+        """
+        schema = schema or OUTPUT_SCHEMA
+        if self.parallel_groups:
+            parts = split_schema(schema)
+            if len(parts) > 1:
+                return self.extract_groups_with_stats(ocr_result, parts)
+        return self.extract_single_with_stats(ocr_result, schema)
+
+    def extract_groups_with_stats(self, ocr_result, parts):
         """
+        Extract each sub-schema in its own call, all calls running at once, and merge the results
         
+        Args:
+            ocr_result: Result from Azure Document Intelligence
+            parts: Sub-schemas, as returned by split_schema
+            
+        Returns:
+            Tuple of (JSON object with extracted fields, prompt statistics dictionary summed
+            over the calls, with the number of calls in "calls")
+        """
+        # Each call runs in a copy of this context, so its stages count towards a profiled request
+        with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self.extract_single_with_stats, ocr_result, part)
+                for part in parts
+            ]
+            results = [future.result() for future in futures]
+
+        # Each call only fills its own fields, even if the model returns others (as empty strings)
+        merged = {}
+        for part, (result_json, _) in zip(parts, results):
+            allowed = set(schema_paths(part))
+            merge_fields(merged, {
+                path: value for path, value in flatten_fields(result_json).items() if path in allowed
+            })
+
+        all_stats = [stats for _, stats in results]
+        prompt_tokens = sum(stats["prompt_tokens"] for stats in all_stats)
+        # The baseline stays one call with the full schema, so repeating the OCR text shows up
+        original_tokens = all_stats[0]["original_tokens"]
+        stats = {
+            **all_stats[0],
+            "prompt_tokens": prompt_tokens,
+            "reduction": 1 - prompt_tokens / original_tokens if original_tokens else 0.0,
+            "completion_tokens": sum(stats["completion_tokens"] or 0 for stats in all_stats),
+            "cached": all(stats["cached"] for stats in all_stats),
+            "calls": len(parts),
+        }
+        return merged, stats
+
+    def extract_single_with_stats(self, ocr_result, schema):
+        """Extract a schema in one call; see extract_fields_with_stats"""
+        messages, stats = self.build_messages(ocr_result, schema)
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache_key(ocr_result, schema)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                stats["cached"] = True
+                return json.loads(cached), stats
+
         # Call Azure OpenAI
-        response = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+        response = self.governor.call(
+            self.client.chat.completions.create,
+            messages=messages,
             temperature=0,
             model=self.deployment_name,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            priority=self.priority,
+            tokens=estimate_request_tokens(messages),
         )
         
         # Extract and parse the response
         result_text = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        stats["completion_tokens"] = getattr(usage, "completion_tokens", None)
         
         try:
             result_json = json.loads(result_text)
-            return result_json
         except json.JSONDecodeError:
             # If there's an issue with the JSON, return the schema with empty values
             # TODO: Probably change this to return an error message
-            return output_schema
+            return copy.deepcopy(schema), stats
+
+        if cache_key:
+            self.cache.set(cache_key, json.dumps(result_json, ensure_ascii=False))
+        return result_json, stats
     
\ No newline at end of file
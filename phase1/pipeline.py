@@ -0,0 +1,189 @@
+import copy
+import time
+from ocr_processor import OCRProcessor
+from openai_processor import (
+    OpenAIProcessor, OUTPUT_SCHEMA, schema_paths, subset_schema, flatten_fields, merge_fields,
+)
+from validator import Validator, REQUIRED_PATHS
+from result_cache import ResultCache, hash_file
+from rule_extractor import RuleExtractor
+from ledger import STAGES
+from common.governor import INTERACTIVE
+from common.profiling import profile_request, stage
+
+
+class FormPipeline:
+    """
+    Runs a single form through OCR -> field extraction -> validation.
+
+    The processors are shared between calls, so one pipeline instance can be
+    used from several worker threads at once.
+    """
+
+    def __init__(
+        self, ocr=None, ai=None, validator=None, cache=None, pages_per_chunk=None, use_rules=True,
+        priority=INTERACTIVE,
+    ):
+        # Falls back to PHASE1_CACHE_DIR when no cache is passed in
+        cache = cache or ResultCache.from_env()
+        # Batch runs pass common.governor.BATCH, so interactive requests are admitted first
+        self.ocr = ocr or OCRProcessor(cache=cache, priority=priority)
+        self.ai = ai or OpenAIProcessor(cache=cache, priority=priority)
+        self.validator = validator or Validator()
+        # When set, long PDFs are split into page ranges that are analyzed concurrently
+        self.pages_per_chunk = pages_per_chunk
+        # Fill fields from the OCR text with local rules before asking the LLM
+        self.rules = RuleExtractor() if use_rules else None
+
+    def process(self, file_path, ledger=None, include_text=False, profile=None):
+        """
+        Process a single document
+
+        Args:
+            file_path: Path to a PDF/JPG form, or a seekable binary file-like object
+            ledger: Optional BatchLedger. Each completed stage is recorded in it, and stages
+                a previous run already completed for the same file content are not repeated.
+            include_text: Add the OCR markdown to the record, as "ocr_text"
+            profile: Profile this document (True), or None to follow PROFILING (see common.profiling)
+
+        Returns:
+            Dictionary with the extracted fields, validation results and stage timings.
+            Failures are reported in the "error" field instead of being raised.
+        """
+        with profile_request("form", profile):
+            return self._process(file_path, ledger, include_text)
+
+    def _process(self, file_path, ledger, include_text):
+        record = self.new_record(file_path)
+        completed = 0
+        content_hash = None
+        extracted_text = None
+
+        def checkpoint(stage_name, **artifacts):
+            if ledger is not None:
+                ledger.save_stage(file_path, content_hash, stage_name, record, **artifacts)
+
+        try:
+            if ledger is not None:
+                content_hash = hash_file(file_path)
+                saved_stage, saved_record, extracted_text = ledger.load(file_path, content_hash)
+                if saved_stage:
+                    completed = STAGES.index(saved_stage) + 1
+                    record.update(saved_record, status="ok", error=None, resumed_stages=list(STAGES[:completed]))
+                    if completed == len(STAGES):
+                        return record
+
+            if completed < 1:
+                start_time = time.time()
+                with stage("ocr"):
+                    extracted_text = self.run_ocr(file_path)
+                record["timings"]["ocr"] = time.time() - start_time
+                checkpoint("ocr", ocr_text=extracted_text)
+
+            if completed < 2:
+                start_time = time.time()
+                with stage("extraction"):
+                    record["extracted"], record["prompt_stats"], record["rule_fields"] = self.extract(extracted_text)
+                record["llm_skipped"] = record["prompt_stats"] is None
+                record["timings"]["extraction"] = time.time() - start_time
+                checkpoint("extraction")
+
+            with stage("validation"):
+                self.validate_into(record, record["extracted"])
+            checkpoint("validation")
+            if include_text:
+                record["ocr_text"] = extracted_text
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+            if content_hash is not None:
+                ledger.save_error(file_path, content_hash, str(e))
+
+        return record
+
+    def new_record(self, file_path):
+        """Empty per-document record, as returned by process"""
+        return {
+            "file": getattr(file_path, "name", file_path),
+            "status": "ok",
+            "error": None,
+            "extracted": None,
+            "validation": None,
+            "invalid_fields": [],
+            "prompt_stats": None,
+            "rule_fields": [],
+            "llm_skipped": False,
+            "resumed_stages": [],
+            "timings": {},
+        }
+
+    def run_ocr(self, file_path):
+        """OCR a document, splitting long PDFs into concurrently analyzed chunks if configured"""
+        if self.pages_per_chunk:
+            return self.ocr.process_document_md_parallel(file_path, pages_per_chunk=self.pages_per_chunk)
+        return self.ocr.process_document_md(file_path)
+
+    def validate_into(self, record, extracted_data):
+        """Validate extracted data and store the data, results and timing in a record"""
+        start_time = time.time()
+        validation_results = self.validator.validate_all(extracted_data)
+        record["timings"]["validation"] = time.time() - start_time
+
+        record["extracted"] = extracted_data
+        record["validation"] = {
+            field: {"valid": is_valid, "message": message}
+            for field, (is_valid, message) in validation_results.items()
+        }
+        record["invalid_fields"] = [
+            field for field, (is_valid, _) in validation_results.items() if not is_valid
+        ]
+
+    def extract(self, extracted_text):
+        """
+        Extract fields from OCR text. Fields the rule extractor reads with high confidence are
+        not requested from the LLM, and if it fills every required field (and the result passes
+        validation) the LLM is skipped entirely.
+
+        Returns:
+            Tuple of (extracted data, prompt statistics or None if the LLM was skipped,
+            list of field paths filled by rules)
+        """
+        with stage("rule_extraction"):
+            complete, rule_values = self.pre_extract(extracted_text)
+        if complete is not None:
+            return complete, None, sorted(rule_values)
+
+        remaining = [path for path in schema_paths(OUTPUT_SCHEMA) if path not in rule_values]
+        extracted_data, prompt_stats = self.ai.extract_fields_with_stats(
+            extracted_text, schema=subset_schema(remaining) if rule_values else None
+        )
+        return self.combine(extracted_data, rule_values), prompt_stats, sorted(rule_values)
+
+    def pre_extract(self, extracted_text):
+        """
+        Run the rule extractor ahead of the LLM
+
+        Returns:
+            Tuple of (the complete extracted data, or None; dictionary of dotted field path ->
+            value filled by rules). The data is complete when the rules fill every field
+            validation requires (REQUIRED_PATHS) and the result passes validation; optional
+            fields the rules left empty stay empty. Otherwise only the high-confidence values
+            are returned and the LLM should be asked for the other fields.
+        """
+        if self.rules is None:
+            return None, {}
+
+        rule_values, confidence = self.rules.extract(extracted_text)
+        if all(path in rule_values for path in REQUIRED_PATHS):
+            rule_result = merge_fields(copy.deepcopy(OUTPUT_SCHEMA), rule_values)
+            validation_results = self.validator.validate_all(rule_result)
+            if all(is_valid for is_valid, _ in validation_results.values()):
+                return rule_result, rule_values
+
+        trusted = {path: value for path, value in rule_values.items() if confidence[path] == "high"}
+        return None, trusted
+
+    def combine(self, extracted_data, rule_values):
+        """Merge the LLM output for the remaining fields with the values filled by rules"""
+        result = merge_fields(copy.deepcopy(OUTPUT_SCHEMA), flatten_fields(extracted_data))
+        return merge_fields(result, rule_values)
@@ -0,0 +1,114 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+class ResultCache:
+    """
+    Content-addressed cache for OCR markdown and extracted fields.
+
+    Entries live in a single SQLite file and are evicted least-recently-used
+    first once the total stored size exceeds max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "results.sqlite3")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries (last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a cache from PHASE1_CACHE_DIR / PHASE1_CACHE_MAX_MB.
+        Returns None if caching is not configured.
+        """
+        directory = os.getenv("PHASE1_CACHE_DIR")
+        if not directory:
+            return None
+        max_mb = int(os.getenv("PHASE1_CACHE_MAX_MB", "512"))
+        return cls(directory, max_bytes=max_mb * 1024 * 1024)
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        # Drop the least recently used entries until we're back under budget
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+        expired = []
+        for key, size in rows:
+            if total_size <= self.max_bytes:
+                break
+            expired.append((key,))
+            total_size -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", expired)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def make_key(namespace, *parts):
+    """Build a cache key from a namespace and the versions/hashes that determine the result"""
+    return ":".join([namespace, *(str(part) for part in parts)])
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    with open(file_path, "rb") as f:
+        return hash_stream(f, chunk_size)
+
+
+def hash_stream(stream, chunk_size=1024 * 1024):
+    """Hash a seekable binary stream in chunks and rewind it, so it can still be uploaded"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
@@ -0,0 +1,240 @@
+import re
+from datetime import datetime
+from common.validation import LANDLINE_REGEX, MOBILE_REGEX, validate_israeli_id
+
+# Labels that precede each structured field on the form
+ID_LABELS = ["ת.ז", "ת\"ז", "תעודת זהות", "מספר זהות", "ID number"]
+LANDLINE_LABELS = ["טלפון קווי", "Landline"]
+MOBILE_LABELS = ["טלפון נייד", "נייד", "Mobile"]
+POSTAL_CODE_LABELS = ["מיקוד", "Postal code"]
+TIME_OF_INJURY_LABELS = ["שעת הפגיעה", "Time of injury"]
+DATE_LABELS = {
+    "dateOfBirth": ["תאריך לידה", "Date of birth"],
+    "dateOfInjury": ["תאריך הפגיעה", "Date of injury"],
+    "formFillingDate": ["תאריך מילוי הטופס", "Form filling date"],
+    "formReceiptDateAtClinic": ["תאריך קבלת הטופס בקופה", "Form receipt date"],
+}
+
+# Labels of free-text fields, whose value is taken from the table cell under (or next to) the
+# label or from the rest of the line
+TEXT_LABELS = {
+    "lastName": ["שם משפחה", "Last name"],
+    "firstName": ["שם פרטי", "First name"],
+    "address.street": ["רחוב", "רחוב / תא דואר", "Street"],
+    "address.houseNumber": ["מספר בית", "מס׳ בית", "מס' בית", "House number"],
+    "address.entrance": ["כניסה", "Entrance"],
+    "address.apartment": ["דירה", "Apartment"],
+    "address.city": ["ישוב", "יישוב", "City"],
+    "address.poBox": ["תא דואר", "PO box"],
+    "jobType": ["סוג העבודה", "Job type"],
+    "accidentLocation": ["מקום התאונה", "Accident location"],
+    "accidentAddress": ["כתובת מקום התאונה", "Accident address"],
+    "accidentDescription": ["נסיבות הפגיעה", "תיאור התאונה", "Accident description"],
+    "injuredBodyPart": ["האיבר שנפגע", "Injured body part"],
+    "signature": ["חתימה", "Signature"],
+}
+
+SELECTED_MARK = r"(?:☒|:selected:)"
+GENDER_REGEX = re.compile(SELECTED_MARK + r"\s*(זכר|נקבה)")
+HEALTH_FUND_REGEX = re.compile(SELECTED_MARK + r"\s*(כללית|מאוחדת|מכבי|לאומית)")
+
+DATE_VALUE_REGEX = re.compile(r"(\d{1,2})\s*[./\-\s]\s*(\d{1,2})\s*[./\-\s]\s*(\d{4})|(\d{2})(\d{2})(\d{4})")
+TIME_VALUE_REGEX = re.compile(r"\b(\d{1,2}):(\d{2})\b")
+PHONE_VALUE_REGEX = re.compile(r"(?<!\d)0\d(?:[\-\s]?\d){7,8}(?!\d)")
+DIGITS_VALUE_REGEX = re.compile(r"(?<!\d)\d(?:\s?\d){5,8}(?!\d)")
+
+TABLE_REGEX = re.compile(r"<table[^>]*>(.*?)</table>", re.DOTALL)
+ROW_REGEX = re.compile(r"<tr[^>]*>(.*?)</tr>", re.DOTALL)
+CELL_REGEX = re.compile(r"<(t[dh])([^>]*)>(.*?)</t[dh]>", re.DOTALL)
+COLSPAN_REGEX = re.compile(r"colspan=\"?(\d+)")
+TAG_REGEX = re.compile(r"<[^>]+>")
+COMMENT_REGEX = re.compile(r"<!--.*?-->", re.DOTALL)
+
+# How far after a label (in characters of flattened text) its value may appear
+VALUE_WINDOW = 60
+
+
+class RuleExtractor:
+    """
+    Fills form fields straight from the OCR markdown using labels, checkbox marks and
+    value formats, so the LLM only has to handle what the rules could not read.
+
+    Structured fields (ID, phones, postal code, dates, time, checkboxes) are only filled when the
+    value passes its format check and are reported with "high" confidence. Free-text fields taken
+    from the cell or text next to their label are reported with "medium" confidence.
+    """
+
+    def extract(self, markdown):
+        """
+        Args:
+            markdown: OCR markdown from OCRProcessor.process_document_md
+
+        Returns:
+            Tuple of (dictionary of dotted field path -> value, dictionary of dotted field path -> confidence)
+        """
+        text = self._flatten(markdown)
+        fields = {}
+        confidence = {}
+
+        def fill(path, value, level):
+            if value:
+                fields[path] = value
+                confidence[path] = level
+
+        fill("idNumber", self._find_id_number(text), "high")
+        fill("landlinePhone", self._find_after(text, LANDLINE_LABELS, PHONE_VALUE_REGEX, _as_landline), "high")
+        fill("mobilePhone", self._find_after(text, MOBILE_LABELS, PHONE_VALUE_REGEX, _as_mobile), "high")
+        fill("address.postalCode", self._find_after(text, POSTAL_CODE_LABELS, DIGITS_VALUE_REGEX, _as_postal_code), "high")
+        fill("timeOfInjury", self._find_after(text, TIME_OF_INJURY_LABELS, TIME_VALUE_REGEX, _as_time), "high")
+
+        for field, labels in DATE_LABELS.items():
+            date = self._find_after(text, labels, DATE_VALUE_REGEX, _as_date)
+            if date:
+                for part, value in zip(("day", "month", "year"), date):
+                    fill(f"{field}.{part}", value, "high")
+
+        gender = GENDER_REGEX.search(text)
+        if gender:
+            fill("gender", gender.group(1), "high")
+        health_fund = HEALTH_FUND_REGEX.search(text)
+        if health_fund:
+            fill("medicalInstitutionFields.healthFundMember", health_fund.group(1), "high")
+
+        tables = self._tables(markdown)
+        for path, labels in TEXT_LABELS.items():
+            if path not in fields:
+                fill(path, self._find_text_value(markdown, tables, labels), "medium")
+
+        return fields, confidence
+
+    def _flatten(self, markdown):
+        text = COMMENT_REGEX.sub(" ", markdown)
+        text = TAG_REGEX.sub(" ", text)
+        return re.sub(r"[ \t]+", " ", text)
+
+    def _find_after(self, text, labels, value_regex, convert):
+        """Return the first converted value found within VALUE_WINDOW characters after any of the labels"""
+        for label in labels:
+            for match in re.finditer(re.escape(label), text, re.IGNORECASE):
+                window = text[match.end():match.end() + VALUE_WINDOW]
+                for value_match in value_regex.finditer(window):
+                    value = convert(value_match)
+                    if value:
+                        return value
+        return None
+
+    def _find_id_number(self, text):
+        value = self._find_after(text, ID_LABELS, DIGITS_VALUE_REGEX, _as_id_number)
+        if value:
+            return value
+
+        # Without a readable label, accept a lone checksum-valid 9-digit number
+        candidates = {
+            match.group(0) for match in re.finditer(r"(?<!\d)\d{9}(?!\d)", text)
+            if validate_israeli_id(match.group(0))[0]
+        }
+        return candidates.pop() if len(candidates) == 1 else None
+
+    def _tables(self, markdown):
+        """
+        Returns:
+            List of tables, each a list of (row cells, whether the row is a header row), with
+            cells spanning several columns repeated so column indexes line up across rows
+        """
+        tables = []
+        for table in TABLE_REGEX.findall(markdown):
+            rows = []
+            for row in ROW_REGEX.findall(table):
+                cells = []
+                header = True
+                for tag, attributes, content in CELL_REGEX.findall(row):
+                    text = self._flatten(content).strip()
+                    span = COLSPAN_REGEX.search(attributes)
+                    cells.extend([text] * (int(span.group(1)) if span else 1))
+                    header = header and (tag == "th" or not text or _is_label(text))
+                if cells:
+                    rows.append((cells, header))
+            tables.append(rows)
+        return tables
+
+    def _find_text_value(self, markdown, tables, labels):
+        # Table layout: under a header row the value is in the same column of the next row,
+        # otherwise in the cell next to the label
+        for rows in tables:
+            for r, (cells, header) in enumerate(rows):
+                for c, cell in enumerate(cells):
+                    if not _matches(cell.rstrip(":"), labels):
+                        continue
+                    if header:
+                        below = rows[r + 1][0] if r + 1 < len(rows) else []
+                        value = below[c] if c < len(below) else ""
+                    else:
+                        value = cells[c + 1] if c + 1 < len(cells) else ""
+                    if value and not _is_label(value):
+                        return value
+
+        # Text layout: "label: value" on a single line
+        for line in self._flatten(markdown).splitlines():
+            for label in labels:
+                match = re.match(rf"\s*{re.escape(label)}\s*:\s*(.+)$", line, re.IGNORECASE)
+                if match and not _is_label(match.group(1).strip()):
+                    return match.group(1).strip()
+        return None
+
+
+def _normalize(value):
+    return re.sub(r"[\s.:'\"׳״]+", "", value.lower())
+
+
+def _matches(value, labels):
+    value = _normalize(value)
+    return bool(value) and any(value == _normalize(label) for label in labels)
+
+
+ALL_LABELS = (
+    ID_LABELS + LANDLINE_LABELS + MOBILE_LABELS + POSTAL_CODE_LABELS + TIME_OF_INJURY_LABELS
+    + [label for labels in DATE_LABELS.values() for label in labels]
+    + [label for labels in TEXT_LABELS.values() for label in labels]
+)
+
+
+def _is_label(value):
+    return _matches(value, ALL_LABELS)
+
+
+def _digits(value):
+    return re.sub(r"\D", "", value)
+
+
+def _as_id_number(match):
+    value = _digits(match.group(0))
+    return value if len(value) == 9 and validate_israeli_id(value)[0] else None
+
+
+def _as_landline(match):
+    value = _digits(match.group(0))
+    return value if LANDLINE_REGEX.match(value) and not MOBILE_REGEX.match(value) else None
+
+
+def _as_mobile(match):
+    value = _digits(match.group(0))
+    return value if MOBILE_REGEX.match(value) else None
+
+
+def _as_postal_code(match):
+    value = _digits(match.group(0))
+    return value if len(value) == 7 else None
+
+
+def _as_time(match):
+    hour, minute = int(match.group(1)), int(match.group(2))
+    return f"{hour:02d}:{minute:02d}" if hour < 24 and minute < 60 else None
+
+
+def _as_date(match):
+    day, month, year = match.group(1, 2, 3) if match.group(1) else match.group(4, 5, 6)
+    try:
+        datetime(year=int(year), month=int(month), day=int(day))
+    except ValueError:
+        return None
+    return (str(int(day)), str(int(month)), year)
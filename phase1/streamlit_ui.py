@@ -1,15 +1,39 @@
+import requests
 import streamlit as st
-import tempfile
-import os
-import time
-from ocr_processor import OCRProcessor
-from openai_processor import OpenAIProcessor
-from validator import Validator
+from job_client import submit_form, wait_for_job
+from common.profiling import profile_request
 
-# Initialize processors
-ocr = OCRProcessor()
-ai = OpenAIProcessor()
-validator = Validator()
+STATUS_LABELS = {
+    "queued": "Waiting for a free worker...",
+    "running": "Extracting text and structured data from document...",
+}
+
+
+def process_upload(uploaded_file, jobs, on_status):
+    """
+    Wait for the job of an uploaded file, submitting the file if it has no job yet or the
+    service no longer knows its job (e.g. after a restart)
+
+    Returns:
+        The finished job's status and result, also stored in jobs
+    """
+    job = jobs.get(uploaded_file.file_id)
+    if job is not None:
+        try:
+            job = wait_for_job(job["job_id"], on_status=on_status)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            job = None
+
+    if job is None:
+        # The upload is passed as a file object, not copied into a bytes value
+        uploaded_file.seek(0)
+        jobs[uploaded_file.file_id] = submit_form(uploaded_file.name, uploaded_file)
+        job = wait_for_job(jobs[uploaded_file.file_id]["job_id"], on_status=on_status)
+
+    jobs[uploaded_file.file_id] = job
+    return job
 
 
 def main():
@@ -20,63 +44,72 @@ def main():
     uploaded_file = st.file_uploader("Choose a file", type=["pdf", "jpg", "jpeg"])
 
     if uploaded_file is not None:
-        # Save uploaded file to temporary location
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_path = tmp_file.name
-
         try:
-            # OCR Processing
-            with st.spinner("Extracting text from document..."):
-                start_time = time.time()
-                extracted_text = ocr.process_document_md(tmp_path)
-                ocr_time = time.time() - start_time
-
-            # Show checkmark after OCR completion
-            st.success("Text extraction completed ✓")
-
-            # AI Processing
-            with st.spinner("Extracting structured data..."):
-                start_time = time.time()
-                extracted_data = ai.extract_fields(extracted_text)
-                ai_time = time.time() - start_time
-
-            # Validation
-            validation_results = validator.validate_all(extracted_data)
-
-            # Display results
+            # Forms are processed by the job service; reruns of this script (e.g. opening the
+            # expander) poll the same job instead of submitting the file again, and the finished
+            # job is kept here, as the service forgets it after PHASE1_JOB_TTL
+            jobs = st.session_state.setdefault("jobs", {})
+            job = jobs.get(uploaded_file.file_id)
+            if job is None or job["status"] not in ("done", "failed"):
+                status_text = st.empty()
+                with st.spinner("Processing document..."):
+                    job = process_upload(
+                        uploaded_file,
+                        jobs,
+                        on_status=lambda status: status_text.caption(STATUS_LABELS.get(status["status"], "")),
+                    )
+                status_text.empty()
+
+            record = job["result"]
+            if job["status"] != "done":
+                st.error(f"Processing failed: {job['error']}")
+                return
+
+            # Show checkmark after completion
             st.success("Processing completed successfully ✓")
 
             # Metrics
-            col1, col2 = st.columns(2)
+            timings = record["timings"]
+            prompt_stats = record["prompt_stats"]
+            col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("OCR Processing Time", f"{ocr_time:.2f}s")
+                st.metric("OCR Processing Time", f"{timings.get('ocr', 0):.2f}s")
             with col2:
-                st.metric("AI Processing Time", f"{ai_time:.2f}s")
+                st.metric("AI Processing Time", f"{timings.get('extraction', 0):.2f}s")
+            with col3:
+                if prompt_stats is None:
+                    st.metric("Prompt Tokens (est.)", 0, "LLM skipped", delta_color="off")
+                else:
+                    st.metric(
+                        "Prompt Tokens (est.)",
+                        prompt_stats["prompt_tokens"],
+                        f"-{prompt_stats['reduction']:.0%}",
+                        delta_color="inverse",
+                    )
+            st.caption(f"{len(record['rule_fields'])} fields read directly from the document layout")
 
             # Results columns
             col_left, col_right = st.columns([2, 1])
 
             with col_left:
                 st.subheader("Extracted Data")
-                st.json(extracted_data)
+                st.json(record["extracted"])
 
             with col_right:
                 st.subheader("Validation Results")
-                for field, (is_valid, message) in validation_results.items():
-                    if not is_valid:
-                        st.error(f"{field}: {message}")
+                for field, result in record["validation"].items():
+                    if not result["valid"]:
+                        st.error(f"{field}: {result['message']}")
 
             # Raw Extracted Text
             with st.expander("View Raw Extracted Text"):
-                st.code(extracted_text)
+                st.code(record.get("ocr_text") or "")
 
         except Exception as e:
             st.error(f"Processing failed: {str(e)}")
-        finally:
-            # Clean up temporary file
-            os.unlink(tmp_path)
 
 
 if __name__ == "__main__":
-    main()
+    # With PROFILING=1, each rerun of this script is profiled as a "ui_rerun" request
+    with profile_request("ui_rerun"):
+        main()
@@ -1,17 +1,71 @@
-import re
 from datetime import datetime
+import numpy as np
+from common.validation import (
+    HEBREW_ENGLISH_REGEX, STREET_REGEX, LANDLINE_REGEX, MOBILE_REGEX, TIME_REGEX,
+    TZ_WEIGHTS, FORM_GENDERS, HEALTH_FUND_OPTIONS, validate_israeli_id,
+)
+
+TZ_WEIGHTS_ARRAY = np.array(TZ_WEIGHTS, dtype=np.uint8)
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+# Range of a C int; larger date components make datetime() raise OverflowError instead of ValueError
+C_INT_MIN, C_INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+DATE_FIELDS = ['dateOfBirth', 'dateOfInjury', 'formFillingDate', 'formReceiptDateAtClinic']
+
+# Column paths read by validate_all, in the layout expected by validate_batch
+FIELD_PATHS = [
+    'lastName', 'firstName', 'idNumber', 'gender',
+    'address.street', 'address.houseNumber', 'address.city', 'address.postalCode', 'address.poBox',
+    'landlinePhone', 'mobilePhone', 'timeOfInjury',
+    'accidentLocation', 'accidentAddress', 'accidentDescription', 'injuredBodyPart',
+    'medicalInstitutionFields.healthFundMember',
+    'medicalInstitutionFields.natureOfAccident',
+    'medicalInstitutionFields.medicalDiagnoses',
+    'signature',
+] + [f'{field}.{part}' for field in DATE_FIELDS for part in ('day', 'month', 'year')]
+
+# Paths validate_all rejects when empty; at least one phone number is required as well
+REQUIRED_PATHS = [
+    'lastName', 'firstName', 'idNumber', 'gender',
+    'address.street', 'address.houseNumber', 'address.city', 'address.postalCode',
+    'accidentLocation', 'accidentAddress', 'accidentDescription', 'injuredBodyPart',
+    'medicalInstitutionFields.healthFundMember', 'signature',
+] + [f'{field}.{part}' for field in DATE_FIELDS for part in ('day', 'month', 'year')]
+
+# Placeholder for date components of a date value that is not a dictionary
+MALFORMED = object()
+
+
+def records_to_columns(records):
+    """
+    Convert a list of extracted records into the columnar layout used by Validator.validate_batch
+    """
+    columns = {path: [] for path in FIELD_PATHS}
+    for record in records:
+        for path in FIELD_PATHS:
+            if '.' not in path:
+                columns[path].append(record.get(path, ''))
+                continue
+            parent, child = path.split('.')
+            value = record.get(parent, {})
+            if parent in DATE_FIELDS and not isinstance(value, dict):
+                columns[path].append(MALFORMED)
+            else:
+                columns[path].append(value.get(child, ''))
+    return columns
+
 
 class Validator:
     def __init__(self):
-        self.hebrew_english_regex = r'^[A-Za-zא-ת\s]+$'
-        self.street_regex = r'^[A-Za-zא-ת0-9\s]+$'
-        self.landline_regex = r'^0\d\d{7}$'
-        self.mobile_regex = r'^05\d\d{7}$'
-        self.time_regex = r'^\d{2}:\d{2}$'
-        self.health_fund_options = [
-            'כללית', 'מאוחדת', 'מכבי', 'לאומית',
-            'הנפגע חבר בקופת חולים', 'הנפגע אינו חבר בקופת חולים'
-        ]
+        self.hebrew_english_regex = HEBREW_ENGLISH_REGEX
+        self.street_regex = STREET_REGEX
+        self.landline_regex = LANDLINE_REGEX
+        self.mobile_regex = MOBILE_REGEX
+        self.time_regex = TIME_REGEX
+        self.health_fund_options = HEALTH_FUND_OPTIONS
+        self.gender_options = FORM_GENDERS
+        self._gender_options_lower = {v.lower() for v in self.gender_options}
 
     def validate_all(self, data):
         results = {}
@@ -61,36 +115,195 @@ class Validator:
         
         return results
 
+    def validate_batch(self, columns):
+        """
+        Validates many records at once. Produces the same verdicts as calling validate_all on each record.
+
+        Args:
+            columns: Mapping of field path (e.g. "lastName", "address.street", "dateOfBirth.day")
+                to an equal-length sequence of values, as produced by records_to_columns
+
+        Returns:
+            Dictionary with the same keys as validate_all, mapping each field to a
+            (valid, messages) tuple of NumPy arrays
+        """
+        size = len(next(iter(columns.values()))) if columns else 0
+
+        def column(path):
+            values = columns.get(path)
+            return [''] * size if values is None else list(values)
+
+        def date_columns(field):
+            return column(f'{field}.day'), column(f'{field}.month'), column(f'{field}.year')
+
+        landline = column('landlinePhone')
+        mobile = column('mobilePhone')
+
+        results = {}
+
+        # Personal Information
+        results['lastName'] = self._batch_required_match(column('lastName'), self.hebrew_english_regex)
+        results['firstName'] = self._batch_required_match(column('firstName'), self.hebrew_english_regex)
+        results['idNumber'] = self._batch_id_number(column('idNumber'))
+        results['gender'] = _verdicts_from_codes(
+            [0 if value.lower() in self._gender_options_lower else 1 for value in column('gender')],
+            ["Valid", f"Must be one of: {', '.join(self.gender_options)}"]
+        )
+        results['dateOfBirth'] = self._batch_date(*date_columns('dateOfBirth'))
+
+        # Address Information
+        results['street'] = self._batch_required_match(column('address.street'), self.street_regex)
+        results['houseNumber'] = _verdicts([self.validate_house_number(v) for v in column('address.houseNumber')])
+        results['city'] = self._batch_required_match(column('address.city'), self.hebrew_english_regex)
+        results['postalCode'] = _verdicts([self.validate_postal_code(v) for v in column('address.postalCode')])
+        results['poBox'] = _verdicts([self.validate_po_box(v) for v in column('address.poBox')])
+
+        # Contact Information
+        results['landlinePhone'] = self._batch_optional_match(
+            landline, self.landline_regex, "Invalid format (e.g., 031234567)"
+        )
+        results['mobilePhone'] = self._batch_optional_match(
+            mobile, self.mobile_regex, "Invalid format (e.g., 0501234567)"
+        )
+        results['phoneValidation'] = _verdicts_from_codes(
+            [1 if not l and not m else 0 for l, m in zip(landline, mobile)],
+            ["Valid", "At least one phone number (mobile or landline) is required"]
+        )
+
+        # Accident Information
+        results['dateOfInjury'] = self._batch_date(*date_columns('dateOfInjury'))
+        results['timeOfInjury'] = self._batch_optional_match(
+            column('timeOfInjury'), self.time_regex, "Invalid time format (HH:MM)"
+        )
+        results['accidentLocation'] = self._batch_required(column('accidentLocation'), 'Accident location')
+        results['accidentAddress'] = self._batch_required(column('accidentAddress'), 'Accident address')
+        results['accidentDescription'] = self._batch_required(column('accidentDescription'), 'Accident description')
+        results['injuredBodyPart'] = self._batch_required(column('injuredBodyPart'), 'Injured body part')
+
+        # Dates
+        results['formFillingDate'] = self._batch_date(*date_columns('formFillingDate'))
+        results['formReceiptDateAtClinic'] = self._batch_date(*date_columns('formReceiptDateAtClinic'))
+
+        # Medical Information
+        results['healthFundMember'] = _verdicts(
+            [self.validate_health_fund(v) for v in column('medicalInstitutionFields.healthFundMember')]
+        )
+        results['natureOfAccident'] = _verdicts(
+            [self.validate_optional(v, 'Nature of accident')
+             for v in column('medicalInstitutionFields.natureOfAccident')]
+        )
+        results['medicalDiagnoses'] = _verdicts(
+            [self.validate_optional(v, 'Medical diagnoses')
+             for v in column('medicalInstitutionFields.medicalDiagnoses')]
+        )
+
+        # Signature
+        results['signature'] = self._batch_required(column('signature'), 'Signature')
+
+        return results
+
+    def _batch_required_match(self, values, pattern):
+        codes = [1 if not value else 2 if not pattern.match(value) else 0 for value in values]
+        return _verdicts_from_codes(codes, ["Valid", "Required field", "Invalid characters"])
+
+    def _batch_optional_match(self, values, pattern, message):
+        codes = [1 if value and not pattern.match(value) else 0 for value in values]
+        return _verdicts_from_codes(codes, ["Valid", message])
+
+    def _batch_required(self, values, field_name):
+        codes = [0 if value else 1 for value in values]
+        return _verdicts_from_codes(codes, ["Valid", f"{field_name} is required"])
+
+    def _batch_id_number(self, values):
+        """
+        Validates ID numbers, running the TZ checksum over all well-formed ASCII numbers at once
+        """
+        valid = np.zeros(len(values), dtype=bool)
+        messages = np.full(len(values), "Required field", dtype=object)
+
+        checksum_rows = []
+        checksum_digits = []
+        for i, value in enumerate(values):
+            if not value:
+                continue
+            if not value.isdigit() or len(value) > 9:
+                messages[i] = "Invalid format (must be up to 9 digits)"
+            elif value.isascii():
+                checksum_rows.append(i)
+                checksum_digits.append(value.zfill(9))
+            else:
+                # Non-ASCII digits keep the per-record semantics of int()
+                valid[i], messages[i] = self.validate_tz(value)
+
+        if checksum_rows:
+            digits = np.frombuffer("".join(checksum_digits).encode("ascii"), dtype=np.uint8).reshape(-1, 9) - ord("0")
+            multiplied = digits * TZ_WEIGHTS_ARRAY
+            summed = np.where(multiplied > 9, multiplied - 9, multiplied)
+            passed = summed.sum(axis=1) % 10 == 0
+
+            rows = np.array(checksum_rows)
+            valid[rows] = passed
+            messages[rows[passed]] = "Valid TZ number"
+            messages[rows[~passed]] = "Invalid TZ number (checksum failed)"
+
+        return valid, messages
+
+    def _batch_date(self, days, months, years):
+        """
+        Validates dates: components are parsed per record, calendar checks run on whole columns
+        """
+        size = len(days)
+        messages = np.full(size, "Valid date", dtype=object)
+        parsed_rows = []
+        parsed_values = []
+
+        for i, (day, month, year) in enumerate(zip(days, months, years)):
+            if day is MALFORMED:
+                messages[i] = "Invalid format"
+                continue
+            if not (day and month and year):
+                messages[i] = "Missing components"
+                continue
+            try:
+                year, month, day = int(year), int(month), int(day)
+            except ValueError:
+                messages[i] = "Invalid date"
+                continue
+            except Exception:
+                messages[i] = "Invalid format"
+                continue
+            if not (C_INT_MIN <= year <= C_INT_MAX and C_INT_MIN <= month <= C_INT_MAX
+                    and C_INT_MIN <= day <= C_INT_MAX):
+                messages[i] = "Invalid format"
+                continue
+            parsed_rows.append(i)
+            parsed_values.append((year, month, day))
+
+        valid = np.zeros(size, dtype=bool)
+        if not parsed_rows:
+            return valid, messages
+
+        parsed = np.array(parsed_values, dtype=np.int64)
+        year, month, day = parsed[:, 0], parsed[:, 1], parsed[:, 2]
+        leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        days_in_month = DAYS_IN_MONTH[np.clip(month, 1, 12) - 1] + (leap & (month == 2))
+        parsed_valid = (
+            (year >= 1) & (year <= 9999)
+            & (month >= 1) & (month <= 12)
+            & (day >= 1) & (day <= days_in_month)
+        )
+
+        rows = np.array(parsed_rows)
+        valid[rows] = parsed_valid
+        messages[rows[~parsed_valid]] = "Invalid date"
+
+        return valid, messages
+
     def validate_tz(self, tz_number):
         """
         Validates an Israeli ID number (TZ) using the official algorithm.
         """
-        if not tz_number or not tz_number.isdigit() or len(tz_number) > 9:
-            return (False, "Invalid format (must be up to 9 digits)")
-        
-        # Pad the number with leading zeros to make it 9 digits
-        tz_padded = tz_number.zfill(9)
-        
-        # Step 1: Create the alternating 1-2 pattern
-        pattern = [1, 2, 1, 2, 1, 2, 1, 2, 1]
-        
-        # Step 2: Multiply each digit by its corresponding pattern digit
-        multiplied = [int(tz_padded[i]) * pattern[i] for i in range(9)]
-        
-        # Step 3: Sum the digits of numbers greater than 9
-        summed = []
-        for num in multiplied:
-            if num > 9:
-                summed.append(sum(map(int, str(num))))
-            else:
-                summed.append(num)
-        
-        # Step 4: Check if the total sum is divisible by 10
-        total_sum = sum(summed)
-        if total_sum % 10 == 0:
-            return (True, "Valid TZ number")
-        else:
-            return (False, "Invalid TZ number (checksum failed)")
+        return validate_israeli_id(tz_number)
 
     def validate_id_number(self, value):
         """
@@ -132,14 +345,13 @@ class Validator:
     def validate_name(self, value):
         if not value:
             return (False, "Required field")
-        if not re.match(self.hebrew_english_regex, value):
+        if not self.hebrew_english_regex.match(value):
             return (False, "Invalid characters")
         return (True, "Valid")
 
     def validate_gender(self, value):
-        valid = ['male', 'female', 'זכר', 'נקבה']
-        if value.lower() not in [v.lower() for v in valid]:
-            return (False, f"Must be one of: {', '.join(valid)}")
+        if value.lower() not in self._gender_options_lower:
+            return (False, f"Must be one of: {', '.join(self.gender_options)}")
         return (True, "Valid")
 
     def validate_date(self, date_dict):
@@ -161,7 +373,7 @@ class Validator:
     def validate_street(self, value):
         if not value:
             return (False, "Required field")
-        if not re.match(self.street_regex, value):
+        if not self.street_regex.match(value):
             return (False, "Invalid characters")
         return (True, "Valid")
 
@@ -175,7 +387,7 @@ class Validator:
     def validate_city(self, value):
         if not value:
             return (False, "Required field")
-        if not re.match(self.hebrew_english_regex, value):
+        if not self.hebrew_english_regex.match(value):
             return (False, "Invalid characters")
         return (True, "Valid")
 
@@ -192,21 +404,35 @@ class Validator:
         return (True, "Valid") if not value else (True, "Valid (optional)")
 
     def validate_landline(self, value):
-        if value and not re.match(self.landline_regex, value):
+        if value and not self.landline_regex.match(value):
             return (False, "Invalid format (e.g., 031234567)")
         return (True, "Valid")
 
     def validate_mobile(self, value):
-        if value and not re.match(self.mobile_regex, value):
+        if value and not self.mobile_regex.match(value):
             return (False, "Invalid format (e.g., 0501234567)")
         return (True, "Valid")
 
     def validate_time(self, value):
-        if value and not re.match(self.time_regex, value):
+        if value and not self.time_regex.match(value):
             return (False, "Invalid time format (HH:MM)")
         return (True, "Valid")
 
     def validate_required(self, value, field_name):
         if not value:
             return (False, f"{field_name} is required")
-        return (True, "Valid")
\ No newline at end of file
+        return (True, "Valid")
+
+
+def _verdicts_from_codes(codes, messages):
+    """Convert per-record indexes into a message table into a (valid, messages) pair; code 0 means valid"""
+    codes = np.array(codes, dtype=np.int8)
+    return codes == 0, np.array(messages, dtype=object)[codes]
+
+
+def _verdicts(pairs):
+    """Convert a list of (is_valid, message) tuples into a (valid, messages) pair of arrays"""
+    valid = np.fromiter((is_valid for is_valid, _ in pairs), dtype=bool, count=len(pairs))
+    messages = np.empty(len(pairs), dtype=object)
+    messages[:] = [message for _, message in pairs]
+    return valid, messages
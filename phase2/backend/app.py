@@ -1,7 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse
 import uvicorn
 import logging
+import hashlib
+import uuid
+from pydantic import BaseModel
 from .ai_processor import OpenAIProcessor
+from .single_flight import SingleFlight
+from .sessions import SessionStore, parse_transcript
+from .prompts import EXTRACTION_PROMPT, QNA_PROMPT, COLLECTION_PROMPT
+from common.profiling import profile_request, requested, stage
 from dotenv import load_dotenv, find_dotenv
 import sys
 
@@ -16,6 +24,14 @@ logging.basicConfig(
 
 load_dotenv(find_dotenv())
 
+
+class ChatMessage(BaseModel):
+    session_id: str
+    message: str
+    # Client-generated ID of the message; a resent message gets the reply already given to it
+    message_id: str = ""
+
+
 class ChatbotApp:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
@@ -24,6 +40,10 @@ class ChatbotApp:
         self.register_endpoints()
 
         self.processor = OpenAIProcessor()
+        # Identical turns of the same session (reruns, double submits) share one computation
+        self.single_flight = SingleFlight()
+        # Transcripts are kept here, so clients send only the new message of each turn
+        self.sessions = SessionStore()
         self.logger.info("ChatbotApp initialized")
 
 
@@ -31,15 +51,74 @@ class ChatbotApp:
         @self.app.get("/ping")
         async def ping():
             return {"message": "pong"}
+
+        @self.app.get("/ready")
+        async def ready():
+            # /ping answers as soon as the server is up; /ready once the default RAG index is loaded
+            rag = self.processor.corpora.get()
+            corpora = self.processor.corpora.status()
+            if rag.ready.is_set():
+                return {"ready": True, "documents": len(rag.corpus), "corpora": corpora}
+            status = f"failed: {rag.error}" if rag.error else "warming up"
+            return JSONResponse(status_code=503, content={"ready": False, "status": status, "corpora": corpora})
         
+        @self.app.get("/prompt_stats")
+        async def prompt_stats():
+            # Average build time and cacheable prefix share of the prompts built so far
+            return {prompt.name: prompt.stats() for prompt in (EXTRACTION_PROMPT, QNA_PROMPT, COLLECTION_PROMPT)}
+
         @self.app.post("/generate_response")
-        async def generate_response(chat_history: str):
+        async def generate_response(chat_history: str, session_id: str = "", x_profile: str = Header(None)):
             self.logger.info("Received chat history. Generating response...")
-            extracted_fields = self.processor.extract_fields(chat_history)
-            validation_fields = self.processor.validate_fields(extracted_fields)
-            response = self.processor.generate_response(validation_fields, chat_history)
+            key = hashlib.sha256(f"{session_id}\0{chat_history}".encode("utf-8")).hexdigest()
+            response = await self.single_flight.run(
+                key, self.respond, parse_transcript(chat_history), requested(x_profile)
+            )
             self.logger.info(f"Generated response: {response}")
             return {"response": response}
 
+        @self.app.post("/chat")
+        async def chat(request: ChatMessage, x_profile: str = Header(None)):
+            self.logger.info(f"Received message for session {request.session_id}. Generating response...")
+            message_id = request.message_id or uuid.uuid4().hex
+            key = hashlib.sha256(f"{request.session_id}\0{message_id}".encode("utf-8")).hexdigest()
+            response = await self.single_flight.run(
+                key, self.respond_in_session, request.session_id, request.message, message_id, requested(x_profile)
+            )
+            _, total = self.sessions.page(request.session_id, limit=0)
+            return {"response": response, "message_count": total}
+
+        @self.app.get("/history")
+        async def history(session_id: str, offset: int = 0, limit: int = 20):
+            messages, total = self.sessions.page(session_id, offset, limit)
+            return {"messages": messages, "total": total}
+
+    def respond_in_session(self, session_id, message, message_id, profile=None):
+        """Add a message to the session's transcript and reply to it. Runs in a worker thread."""
+        reply = self.sessions.reply_for(session_id, message_id)
+        if reply is not None:
+            return reply
+
+        messages = self.sessions.add_user_message(session_id, message, message_id)
+        reply = self.respond(messages, profile)
+        self.sessions.add_reply(session_id, message_id, reply)
+        return reply
+
+    def respond(self, messages, profile=None):
+        """
+        Extract and validate the user's fields and generate the next reply. Runs in a worker thread.
+
+        Args:
+            messages: Conversation as a list of {"role": "user" | "assistant", "content": ...} messages
+            profile: Profile this turn (True, from the X-Profile header), or None to follow PROFILING
+        """
+        with profile_request("chat", profile):
+            with stage("extract_fields"):
+                extracted_fields = self.processor.extract_fields(messages)
+            with stage("validate_fields"):
+                validation_fields = self.processor.validate_fields(extracted_fields)
+            with stage("generate_response"):
+                return self.processor.generate_response(validation_fields, messages)
+
     def run(self, **kwargs):
         uvicorn.run(self.app, **kwargs)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from .rag import RAGProcessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS = "default"
+
+
+class CorpusRegistry:
+    """
+    Knowledge bases of several HMOs served from one backend, one index shard per HMO.
+
+    Shards are loaded in the background on their first query. When the embeddings of the loaded
+    shards exceed the memory budget, the least recently used ones are evicted; they are loaded
+    again from their saved index when next needed, without re-embedding. The default shard
+    answers sessions without a shard of their own, or whose shard is still loading or failed
+    to load, and is never evicted. A shard that failed to load is loaded again on its next query.
+    """
+
+    def __init__(self, corpora, memory_budget_bytes=None):
+        """
+        Args:
+            corpora: Dictionary mapping each corpus name (an HMO name, or "default") to a
+                (directory, index path) tuple
+            memory_budget_bytes: Maximum embedding memory of the loaded shards, None for no limit
+        """
+        if DEFAULT_CORPUS not in corpora:
+            raise ValueError(f'A "{DEFAULT_CORPUS}" corpus is required')
+        self.corpora = corpora
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loaded = OrderedDict()  # name -> RAGProcessor, least recently used first
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Corpora from RAG_CORPORA, a JSON object mapping HMO names to data directories, e.g.
+        {"מכבי": "data/maccabi", "כללית": "data/clalit"}. The default corpus is data/phase2_data
+        (RAG_DATA_DIR) with its index at RAG_INDEX_PATH; each other corpus keeps its index next
+        to its directory. RAG_MEMORY_BUDGET_MB limits the embeddings kept loaded.
+        """
+        corpora = {
+            DEFAULT_CORPUS: (
+                os.getenv("RAG_DATA_DIR", "data/phase2_data"),
+                os.getenv("RAG_INDEX_PATH", "data/phase2_index.npz"),
+            )
+        }
+        for name, directory in json.loads(os.getenv("RAG_CORPORA", "{}")).items():
+            corpora[name] = (directory, os.path.normpath(directory) + "_index.npz")
+
+        budget_mb = os.getenv("RAG_MEMORY_BUDGET_MB")
+        return cls(corpora, memory_budget_bytes=float(budget_mb) * 1024 * 1024 if budget_mb else None)
+
+    def route(self, hmo_name):
+        """Name of the corpus serving an HMO"""
+        return hmo_name if hmo_name in self.corpora else DEFAULT_CORPUS
+
+    def get(self, name=DEFAULT_CORPUS):
+        """
+        Returns:
+            The RAGProcessor of a corpus, its loading started if it was not loaded (or failed
+            to load). Callers wait on its ready event before querying it.
+        """
+        with self._lock:
+            rag = self._loaded.get(name)
+            if rag is None or rag.error:
+                directory, index_path = self.corpora[name]
+                logger.info(f"Loading corpus {name} from {directory}")
+                rag = RAGProcessor()
+                rag.start_background_initialization(
+                    directory_path=directory,
+                    index_path=index_path,
+                    on_ready=lambda: self._enforce_budget(keep=name),
+                )
+                self._loaded[name] = rag
+            self._loaded.move_to_end(name)
+            return rag
+
+    def for_hmo(self, hmo_name):
+        """The HMO's shard if it is ready, otherwise the default shard while the HMO's one loads"""
+        name = self.route(hmo_name)
+        rag = self.get(name)
+        if name != DEFAULT_CORPUS and (rag.error or not rag.ready.is_set()):
+            return self.get(DEFAULT_CORPUS)
+        return rag
+
+    def _enforce_budget(self, keep):
+        """Evict least recently used shards, other than keep, until the loaded embeddings fit the budget"""
+        if self.memory_budget_bytes is None:
+            return
+        with self._lock:
+            used = sum(self._embedding_bytes(rag) for rag in self._loaded.values())
+            for name in list(self._loaded):
+                if used <= self.memory_budget_bytes:
+                    break
+                rag = self._loaded[name]
+                # Shards still loading hold no embeddings yet
+                if name in (DEFAULT_CORPUS, keep) or not rag.ready.is_set():
+                    continue
+                del self._loaded[name]
+                used -= self._embedding_bytes(rag)
+                # Queries still running on it keep their reference; its files are closed once unused
+                logger.info(f"Evicted corpus {name}, {used / 1024 / 1024:.1f} MB of embeddings loaded")
+
+    @staticmethod
+    def _embedding_bytes(rag):
+        return rag.corpus.memory_usage()["embedding_bytes"] if rag.ready.is_set() else 0
+
+    def status(self):
+        """
+        Returns:
+            Dictionary with the state of each corpus: "unloaded", "loading", "ready" or the
+            loading error, with the number of documents and embedding memory of loaded ones
+        """
+        with self._lock:
+            loaded = dict(self._loaded)
+        status = {}
+        for name in self.corpora:
+            rag = loaded.get(name)
+            if rag is None:
+                status[name] = {"state": "unloaded"}
+            elif rag.error:
+                status[name] = {"state": f"failed: {rag.error}"}
+            elif not rag.ready.is_set():
+                status[name] = {"state": "loading"}
+            else:
+                status[name] = {
+                    "state": "ready",
+                    "documents": len(rag.corpus),
+                    "embedding_bytes": self._embedding_bytes(rag),
+                }
+        return status
@@ -0,0 +1,252 @@
+import mmap
+import os
+import tempfile
+import numpy as np
+
+# Embedding storage types; int8 rows are quantized with a per-row scale, binary rows keep
+# one sign bit per dimension
+EMBEDDING_DTYPES = ("float32", "float16", "int8", "binary")
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8, "binary": np.uint8}
+
+# Rows scored per block, bounding the float32 copy made of float16/int8 rows
+SCORE_BLOCK_ROWS = 4096
+
+# Candidates of a quantized first pass that are re-ranked with the float32 vectors
+DEFAULT_RERANK_CANDIDATES = 50
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits):
+    """Number of set bits of each byte"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits)
+    return _POPCOUNT[bits]
+
+
+class CorpusStore:
+    """
+    Document texts and embeddings of the knowledge base, laid out compactly.
+
+    Embeddings are L2-normalized rows of one contiguous array (float32, float16, int8 or
+    binary), so a search is a single matrix product (or Hamming distance for binary rows).
+    Texts are written once to a blob file and memory-mapped; only the documents returned by a
+    search are read from it, through an offset table.
+
+    With a quantized dtype, the search is a first pass over the compact rows, and its top
+    rerank_candidates are scored again with the float32 vectors, kept in a memory-mapped
+    .npy file next to the blob, so only the candidates' rows are paged in.
+    """
+
+    def __init__(self, blob_path=None, dtype="float32", rerank_candidates=DEFAULT_RERANK_CANDIDATES):
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype {dtype}, expected one of {', '.join(EMBEDDING_DTYPES)}")
+        self.blob_path = blob_path
+        self.dtype = dtype
+        self.rerank_candidates = rerank_candidates
+
+        self.names = []
+        self._text_spans = {}  # name -> (offset, length) in the blob
+        self._blob = None
+        self._blob_file = None
+
+        self.embedding_names = []  # name of each embedding row
+        self._rows = {}
+        self.embeddings = np.zeros((0, 0), dtype=STORAGE_DTYPES[dtype])
+        self.scales = None  # per-row scale of int8 embeddings
+        self.dimensions = 0
+        self.full_vectors = None  # memory-mapped float32 rows, for re-ranking quantized results
+
+    def write_texts(self, items):
+        """
+        Write the documents to the blob file and map it. Texts are consumed one at a time,
+        so the whole corpus is never held in memory.
+
+        Args:
+            items: Iterable of (name, text) tuples
+        """
+        directory = os.path.dirname(os.path.abspath(self.blob_path)) if self.blob_path else None
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".texts")
+        names, spans, offset = [], {}, 0
+        with os.fdopen(fd, "wb") as blob:
+            for name, text in items:
+                data = text.encode("utf-8")
+                blob.write(data)
+                names.append(name)
+                spans[name] = (offset, len(data))
+                offset += len(data)
+
+        if self.blob_path:
+            # Replace atomically: other workers keep reading the file they mapped
+            os.replace(tmp_path, self.blob_path)
+            path = self.blob_path
+        else:
+            path = tmp_path
+
+        self.close()
+        self.names, self._text_spans = names, spans
+        if offset:
+            self._blob_file = open(path, "rb")
+            self._blob = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if not self.blob_path:
+            # The mapping keeps the data reachable; the name is not needed
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def text(self, name):
+        """Read a document's text from the blob, or None if it is not in the store"""
+        span = self._text_spans.get(name)
+        if span is None:
+            return None
+        offset, length = span
+        if not length:
+            return ""
+        return self._blob[offset:offset + length].decode("utf-8")
+
+    def set_embeddings(self, names, vectors):
+        """
+        Args:
+            names: Name of each embedding row
+            vectors: float32 array (or list of lists) with one embedding per row
+        """
+        if not len(names):
+            self.embedding_names, self._rows, self.scales, self.full_vectors = [], {}, None, None
+            self.embeddings = np.zeros((0, 0), dtype=STORAGE_DTYPES[self.dtype])
+            return
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(names), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        self.scales = None
+        if self.dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127
+            scales[scales == 0] = 1
+            self.embeddings = np.round(matrix / scales[:, None]).astype(np.int8)
+            self.scales = scales.astype(np.float32)
+        elif self.dtype == "binary":
+            self.embeddings = np.packbits(matrix > 0, axis=1)
+        else:
+            self.embeddings = np.ascontiguousarray(matrix, dtype=self.dtype)
+        self.embedding_names = list(names)
+        self._rows = {name: row for row, name in enumerate(self.embedding_names)}
+        self.dimensions = matrix.shape[1]
+
+        self.full_vectors = None
+        if self.dtype != "float32" and self.rerank_candidates:
+            self.full_vectors = self._write_full_vectors(matrix)
+
+    def _write_full_vectors(self, matrix):
+        """Save the normalized float32 rows and map them back read-only"""
+        if self.blob_path:
+            path = os.path.splitext(self.blob_path)[0] + ".vectors.npy"
+            directory = os.path.dirname(os.path.abspath(path))
+        else:
+            path, directory = None, None
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npy")
+        with os.fdopen(fd, "wb") as file:
+            np.save(file, matrix)
+        if path:
+            os.replace(tmp_path, path)
+        vectors = np.load(path or tmp_path, mmap_mode="r")
+        if not path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return vectors
+
+    def search(self, query_embedding, num_results=3):
+        """
+        Returns:
+            List of (name, cosine similarity) tuples, highest first
+        """
+        if not self.embedding_names or num_results <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        scores = self._first_pass_scores(query)
+        if self.full_vectors is None:
+            top = top_indices(scores, num_results)
+            return [(self.embedding_names[i], float(scores[i])) for i in top]
+
+        # Re-rank the first pass candidates with their exact cosine similarity
+        candidates = np.sort(top_indices(scores, max(num_results, self.rerank_candidates)))
+        exact = self.full_vectors[candidates] @ query
+        top = top_indices(exact, num_results)
+        return [(self.embedding_names[candidates[i]], float(exact[i])) for i in top]
+
+    def vectors(self, names):
+        """
+        Returns:
+            float32 array with the normalized embedding of each name as a row, exact when the
+            re-ranking vectors are kept, otherwise decoded from the stored rows
+        """
+        rows = [self._rows[name] for name in names]
+        if self.full_vectors is not None:
+            return np.asarray(self.full_vectors[rows], dtype=np.float32)
+        stored = self.embeddings[rows]
+        if self.dtype == "binary":
+            signs = np.unpackbits(stored, axis=1, count=self.dimensions).astype(np.float32) * 2 - 1
+            return signs / np.sqrt(self.dimensions)
+        matrix = stored.astype(np.float32)
+        if self.scales is not None:
+            matrix *= self.scales[rows, None]
+        return matrix
+
+    def _first_pass_scores(self, query):
+        """Similarity of the query to every row, approximate for quantized rows"""
+        scores = np.empty(len(self.embedding_names), dtype=np.float32)
+        if self.dtype == "binary":
+            # Hamming distance between sign bits, mapped to [-1, 1]
+            query_bits = np.packbits(query > 0)
+            for start in range(0, len(scores), SCORE_BLOCK_ROWS):
+                block = self.embeddings[start:start + SCORE_BLOCK_ROWS]
+                distance = popcount(block ^ query_bits).sum(axis=1, dtype=np.int32)
+                scores[start:start + len(block)] = 1 - 2 * distance / self.dimensions
+            return scores
+
+        for start in range(0, len(scores), SCORE_BLOCK_ROWS):
+            block = self.embeddings[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def memory_usage(self):
+        """
+        Returns:
+            Dictionary with the bytes held in memory by the embeddings, and the bytes of text and
+            of float32 re-ranking vectors kept in memory-mapped files (paged in only when read)
+        """
+        embedding_bytes = self.embeddings.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        return {
+            "embedding_bytes": embedding_bytes,
+            "text_bytes": len(self._blob) if self._blob is not None else 0,
+            "rerank_bytes": self.full_vectors.nbytes if self.full_vectors is not None else 0,
+        }
+
+    def __len__(self):
+        return len(self.embedding_names)
+
+    def __contains__(self, name):
+        return name in self._text_spans
+
+    def close(self):
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+        if self._blob_file is not None:
+            self._blob_file.close()
+            self._blob_file = None
+
+
+def top_indices(scores, k):
+    """Indices of the k highest scores, highest first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.intp)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
@@ -0,0 +1,187 @@
+"""
+Prompt templates of the chatbot.
+
+Each request is laid out as [static system prompt, conversation, per-turn suffix]. The system
+prompts are rendered once at import time, so everything before the suffix is identical between
+turns (the conversation only grows at its end) and the provider's prompt caching can apply.
+"""
+import json
+import logging
+import threading
+import time
+from common.governor import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Define the schema structure (only used as a template)
+SCHEMA_TEMPLATE = {
+    "personalInfo": {
+        "firstName": "",
+        "lastName": "",
+        "idNumber": "",  # Valid 9-digit number
+        "gender": "",  # Male/Female/Other
+        "age": "",  # Between 0 and 120
+    },
+    "healthInsurance": {
+        "hmoName": "",  # מכבי | מאוחדת | כללית
+        "hmoCardNumber": "",  # 9-digit
+        "membershipTier": "",  # זהב | כסף | ארד
+    },
+    "confirmation": False,
+}
+
+EXTRACTION_SYSTEM_PROMPT = f"""
+        You are a data extraction model. Your task is to extract specific fields from the conversation history only in Hebrew or English.
+
+
+        Extract the information into the following JSON schema:
+        {json.dumps(SCHEMA_TEMPLATE, indent=2, ensure_ascii=False)}
+
+        Only once all the information is collected, and the user confirms, then you can set the confirmation field to True.
+        Return only the JSON output."""
+
+QNA_SYSTEM_PROMPT = """
+        # Role
+        You are a helpful healthcare assistant providing information to a user. You must communicate only in Hebrew or English.
+
+        # Task
+        - Tell the user you can help them with their questions regarding their health insurance and our services.
+        - Answer the user's questions based on their information and the relevant context provided.
+
+        # Guidelines
+        - Respond in the same language as the user's most recent question
+        - Be concise but comprehensive
+        - If you don't know the answer, say so clearly
+        - Personalize responses using the user's information when appropriate
+        """
+
+COLLECTION_SYSTEM_PROMPT = """
+        # Role
+        You are an HMO service agent that is tasked with collecting user information by chating with them, and asking them for information. You must communicate only in Hebrew or English.
+
+        # Task
+        Collect the following user information:
+            - First and last name
+            - ID number (valid 9-digit number)
+            - Gender
+            - Age (between 0 and 120)
+            - HMO name (מכבי | מאוחדת | כללית)
+            - HMO card number (9-digit)
+            - Insurance membership tier (זהב | כסף | ארד)
+
+        Consider what information has already been collected according to the validated data given after the conversation, and address any errors.
+
+        # Specifics
+        - Ask for information and conversate in the language of the user's inital message.
+        - Do not switch languages unless the user asks you to.
+        - Ask questions based on a single field at a time.
+        - Only
+
+
+        Once all the information is collected, send the user all the information you have collected and ask for confirmation.
+        """
+
+# Per-turn suffixes, rendered with str.format
+EXTRACTION_SUFFIX = "Extract the fields from the conversation above. Return only the JSON output."
+
+QNA_SUFFIX = """# User Information
+The user has provided the following information:
+{user_data}
+
+# Context
+The following information might be relevant to the user's questions:
+{context}
+
+Answer the user's latest question."""
+
+COLLECTION_SUFFIX = """Current validated data:
+{validation_results}
+
+Continue the conversation from the last message."""
+
+
+def compact_json(data):
+    """JSON without indentation, for data that changes every turn"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def chat_messages(messages):
+    """Keep only the role and content of user/assistant messages, as sent to the model"""
+    return [
+        {"role": message["role"], "content": message["content"]}
+        for message in messages
+        if message.get("role") in ("user", "assistant")
+    ]
+
+
+def latest_user_message(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message["content"]
+    return ""
+
+
+class PromptTemplate:
+    """
+    A static system prompt, followed by the conversation and a per-turn suffix.
+
+    Every build is timed, and the cacheable prefix (system prompt plus conversation) is
+    measured against the whole prompt; totals are available from stats().
+    """
+
+    def __init__(self, name, system_prompt, suffix):
+        self.name = name
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.suffix = suffix
+        self.static_tokens = estimate_tokens(system_prompt, completion_tokens=0)
+
+        self._builds = 0
+        self._build_seconds = 0.0
+        self._prefix_tokens = 0
+        self._total_tokens = 0
+        self._lock = threading.Lock()
+
+    def build(self, messages, **variables):
+        """
+        Args:
+            messages: Conversation as a list of {"role": "user" | "assistant", "content": ...} messages
+            variables: Values of the suffix placeholders
+
+        Returns:
+            List of chat messages to send to the model
+        """
+        start = time.perf_counter()
+        history = chat_messages(messages)
+        suffix = {"role": "system", "content": self.suffix.format(**variables)}
+        prompt = [self.system_message, *history, suffix]
+        build_seconds = time.perf_counter() - start
+
+        prefix_tokens = self.static_tokens + estimate_tokens(history, completion_tokens=0)
+        total_tokens = prefix_tokens + estimate_tokens(suffix["content"], completion_tokens=0)
+        with self._lock:
+            self._builds += 1
+            self._build_seconds += build_seconds
+            self._prefix_tokens += prefix_tokens
+            self._total_tokens += total_tokens
+
+        logger.info(
+            f"{self.name} prompt built in {build_seconds * 1000:.3f} ms, "
+            f"cacheable prefix {prefix_tokens} of {total_tokens} tokens (est.)"
+        )
+        return prompt
+
+    def stats(self):
+        with self._lock:
+            builds = self._builds or 1
+            return {
+                "builds": self._builds,
+                "average_build_ms": self._build_seconds / builds * 1000,
+                "static_tokens": self.static_tokens,
+                "average_prefix_tokens": self._prefix_tokens / builds,
+                "cacheable_share": self._prefix_tokens / self._total_tokens if self._total_tokens else 0.0,
+            }
+
+
+EXTRACTION_PROMPT = PromptTemplate("extraction", EXTRACTION_SYSTEM_PROMPT, EXTRACTION_SUFFIX)
+QNA_PROMPT = PromptTemplate("qna", QNA_SYSTEM_PROMPT, QNA_SUFFIX)
+COLLECTION_PROMPT = PromptTemplate("collection", COLLECTION_SYSTEM_PROMPT, COLLECTION_SUFFIX)
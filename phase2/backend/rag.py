@@ -1,10 +1,15 @@
 import os
+import hashlib
+import threading
 import numpy as np
 from openai import AzureOpenAI
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
 from dotenv import load_dotenv, find_dotenv
 import sys
+from common.governor import get_governor, estimate_tokens, BATCH
+from .corpus import CorpusStore
+from .rerank import Reranker
+from common.profiling import stage
 
 load_dotenv(find_dotenv())
 # Configure logging
@@ -17,10 +22,14 @@ logger = logging.getLogger(__name__)
 
 
 class RAGProcessor:
-    def __init__(self):
+    def __init__(self, embedding_dtype=None):
         """
         Initialize the RAG processor with an OpenAI client and deployment name
         If not provided, it will use the client from the caller
+
+        embedding_dtype sets how the corpus store keeps embeddings: float32, float16, int8 or
+        binary (default from RAG_EMBEDDING_DTYPE, float32). Results of the quantized types are
+        re-ranked with the float32 vectors from disk (RAG_RERANK_CANDIDATES candidates, 0 to disable).
         """
         self.embedding_deployment_name = os.getenv("AZURE_EMBEDDING_DEPLOYMENT")
         self.client = AzureOpenAI(
@@ -28,47 +37,79 @@ class RAGProcessor:
             api_key=os.getenv("AZURE_OPENAI_KEY"),
             api_version=os.getenv("AZURE_EMBEDDING_API_VERSION"),
         )
-        self.file_embeddings = {}
-        self.file_contents = {}  # Add this line to store file contents
+        # Index embeddings are queued behind interactive query embeddings
+        self.governor = get_governor(self.embedding_deployment_name)
+        # Embeddings and memory-mapped texts of the indexed files
+        self.corpus = CorpusStore(
+            dtype=embedding_dtype or os.getenv("RAG_EMBEDDING_DTYPE", "float32"),
+            rerank_candidates=int(os.getenv("RAG_RERANK_CANDIDATES", "50")),
+        )
+        # Decides locally how many of the retrieved documents go into the prompt
+        self.reranker = Reranker(
+            min_score=float(os.getenv("RAG_MIN_SCORE", "0.3")),
+            max_gap=float(os.getenv("RAG_SCORE_GAP", "0.05")),
+        )
+        self.rerank_pool = 8  # documents retrieved for the re-ranker to choose from
+        self.failed_files = {}  # Files without an embedding, with the error that caused it
+
+        # Set once the index is built or loaded; error holds the reason if that failed
+        self.ready = threading.Event()
+        self.error = None
 
     def read_files_from_directory(self, directory_path):
         """
-        Read all text files from a directory
-        Returns a dictionary with filenames as keys and file contents as values
+        Read all text files from a directory into the corpus store, one file at a time
+        Returns a dictionary with filenames as keys and content hashes as values
         """
-        file_contents = {}
+        hashes = {}
 
-        for filename in os.listdir(directory_path):
-            file_path = os.path.join(directory_path, filename)
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r", encoding="utf-8") as file:
-                        file_contents[filename] = file.read()
-                except Exception as e:
-                    logger.error(f"Error reading {filename}: {e}")
+        def read_files():
+            for filename in sorted(os.listdir(directory_path)):
+                file_path = os.path.join(directory_path, filename)
+                if os.path.isfile(file_path):
+                    try:
+                        with open(file_path, "r", encoding="utf-8") as file:
+                            text = file.read()
+                    except Exception as e:
+                        logger.error(f"Error reading {filename}: {e}")
+                        continue
+                    hashes[filename] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                    yield filename, text
 
-        # Store the file contents in the class attribute
-        self.file_contents = file_contents
-        return file_contents
+        self.corpus.write_texts(read_files())
+        return hashes
 
     def generate_embeddings(self, texts):
         """
         Generate embeddings for a list of texts
-        Returns a dictionary mapping each text to its embedding vector
+        Returns a dictionary mapping each text to its embedding vector.
+        Throttled requests are retried; texts that still fail are listed in failed_files.
         """
 
         embeddings = {}
+        failed = {}
+        # texts may be a lazy mapping; each text is read only while it is embedded
 
         for key, text in texts.items():
             try:
-                response = self.client.embeddings.create(
-                    input=text, model=self.embedding_deployment_name
+                response = self.governor.call(
+                    self.client.embeddings.create,
+                    input=text,
+                    model=self.embedding_deployment_name,
+                    priority=BATCH,
+                    tokens=estimate_tokens(text, completion_tokens=0),
                 )
                 embeddings[key] = response.data[0].embedding
             except Exception as e:
                 logger.error(f"Error generating embedding for {key}: {e}")
+                failed[key] = str(e)
 
-        self.file_embeddings = embeddings
+        if failed:
+            logger.error(
+                f"{len(failed)} of {len(texts)} documents are missing from the index: {', '.join(failed)}"
+            )
+
+        self.failed_files = failed
         return embeddings
 
     def find_similar_documents(self, query, num_results=3):
@@ -78,60 +119,146 @@ class RAGProcessor:
         """
         # Generate embedding for the query
         try:
-            query_response = self.client.embeddings.create(
-                input=query, model=self.embedding_deployment_name
+            query_response = self.governor.call(
+                self.client.embeddings.create,
+                input=query,
+                model=self.embedding_deployment_name,
+                tokens=estimate_tokens(query, completion_tokens=0),
             )
             query_embedding = query_response.data[0].embedding
 
-            # Calculate cosine similarity with each document
-            similarities = {}
-            for filename, embedding in self.file_embeddings.items():
-                # Convert embeddings to numpy arrays for cosine similarity calculation
-                similarity = cosine_similarity([query_embedding], [embedding])[0][0]
-                similarities[filename] = similarity
-
-            # Sort by similarity score (highest first)
-            sorted_results = sorted(
-                similarities.items(), key=lambda x: x[1], reverse=True
-            )
-
-            # Return the top num_results
-            return sorted_results[:num_results]
+            # Cosine similarity with every document in one matrix product
+            with stage("vector_search"):
+                return self.corpus.search(query_embedding, num_results)
         except Exception as e:
             logger.error(f"Error finding similar documents: {e}")
             return []
 
-    def get_relevant_context(self, query, num_results=3, include_scores=False):
+    def get_relevant_context(self, query, num_results=3, include_scores=False, user_data=None):
         """
         Get relevant context from the documents for a given query
-        Returns the combined text of the most relevant documents
+        Returns the combined text of the most relevant documents, at most num_results of them,
+        as chosen by the re-ranker (boosted for the user's HMO and tier in user_data)
         """
-        results = self.find_similar_documents(query, num_results)
+        results = self.find_similar_documents(query, max(num_results, self.rerank_pool))
+        with stage("rerank"):
+            results = self.reranker.rerank(
+                results, self.corpus.vectors, self.corpus.text, user_data=user_data, num_results=num_results
+            )
 
         if not results:
             return ""
 
         relevant_context = ""
         for filename, score in results:
-            if filename in self.file_contents:
+            # Only the texts of the results are read from the store
+            text = self.corpus.text(filename)
+            if text is not None:
                 if include_scores:
                     relevant_context += (
                         f"\n[Source: {filename}, Similarity: {score:.4f}]\n"
                     )
                 else:
                     relevant_context += f"\n[Source: {filename}]\n"
-                relevant_context += self.file_contents[filename] + "\n"
+                relevant_context += text + "\n"
 
         return relevant_context
 
-    def initialize_from_directory(self, directory_path):
+    def initialize_from_directory(self, directory_path, index_path=None):
         """
-        Initialize the RAG processor by reading files and generating embeddings
+        Initialize the RAG processor by reading files and generating embeddings.
+        With an index_path, embeddings of unchanged files are loaded from it instead of
+        being generated again, and the updated index is saved back.
         """
         logger.info(f"Reading files from {directory_path}")
-        contents = self.read_files_from_directory(directory_path)
-        logger.info(f"Found {len(contents)} files")
+        if index_path:
+            # The texts are kept next to the index, so workers map the same file
+            self.corpus.blob_path = os.path.splitext(index_path)[0] + ".texts"
+        hashes = self.read_files_from_directory(directory_path)
+        logger.info(f"Found {len(hashes)} files")
+
+        saved = self.load_index(index_path) if index_path else {}
+        reused = {
+            filename: embedding for filename, (content_hash, embedding) in saved.items()
+            if hashes.get(filename) == content_hash
+        }
+        missing = LazyTexts(self.corpus, [filename for filename in hashes if filename not in reused])
+
+        logger.info(f"Generating embeddings for {len(missing)} files, {len(reused)} loaded from the index")
+        generated = self.generate_embeddings(missing)
+        embeddings = {**reused, **generated}
+        filenames = sorted(embeddings)
+        vectors = np.array([embeddings[filename] for filename in filenames], dtype=np.float32)
+        logger.info(f"Generated embeddings for {len(filenames)} files")
+
+        if index_path and generated:
+            self.save_index(index_path, filenames, [hashes[filename] for filename in filenames], vectors)
+
+        self.corpus.set_embeddings(filenames, vectors)
+        usage = self.corpus.memory_usage()
+        logger.info(
+            f"Corpus store: {len(self.corpus)} embeddings ({self.corpus.dtype}) in "
+            f"{usage['embedding_bytes'] / 1024:.1f} KB, {usage['text_bytes'] / 1024:.1f} KB of text and "
+            f"{usage['rerank_bytes'] / 1024:.1f} KB of re-ranking vectors memory-mapped"
+        )
+        self.ready.set()
+
+    def start_background_initialization(self, directory_path, index_path=None, on_ready=None):
+        """Build or load the index in a daemon thread; ready is set (and on_ready called) when it's done"""
+
+        def initialize():
+            try:
+                self.initialize_from_directory(directory_path, index_path)
+                if on_ready:
+                    on_ready()
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"Error initializing the RAG index: {e}")
+
+        thread = threading.Thread(target=initialize, name="rag-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def save_index(self, index_path, filenames, hashes, embeddings):
+        """Save the float32 embeddings with the content hash of each file"""
+        np.savez(
+            index_path,
+            filenames=np.array(filenames),
+            hashes=np.array(hashes),
+            embeddings=np.asarray(embeddings, dtype=np.float32),
+        )
+        logger.info(f"Saved index of {len(filenames)} files to {index_path}")
+
+    def load_index(self, index_path):
+        """
+        Load an index saved by save_index
+        Returns a dictionary mapping each filename to a (content hash, embedding) tuple
+        """
+        if not os.path.exists(index_path):
+            return {}
+        try:
+            with np.load(index_path, allow_pickle=False) as index:
+                return {
+                    str(filename): (str(content_hash), embedding)
+                    for filename, content_hash, embedding in zip(
+                        index["filenames"], index["hashes"], index["embeddings"]
+                    )
+                }
+        except Exception as e:
+            logger.error(f"Error loading index {index_path}, rebuilding it: {e}")
+            return {}
+
+
+class LazyTexts:
+    """Mapping of filenames to their texts, read from the corpus store on access"""
+
+    def __init__(self, corpus, filenames):
+        self.corpus = corpus
+        self.filenames = filenames
+
+    def items(self):
+        for filename in self.filenames:
+            yield filename, self.corpus.text(filename)
 
-        logger.info("Generating embeddings")
-        self.generate_embeddings(contents)
-        logger.info(f"Generated embeddings for {len(self.file_embeddings)} files")
+    def __len__(self):
+        return len(self.filenames)
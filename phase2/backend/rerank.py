@@ -0,0 +1,92 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """
+    Local re-ranking of retrieved documents, deciding how many of them go into the prompt.
+
+    1. Documents mentioning the user's HMO or membership tier get a small score boost.
+    2. Documents below min_score are dropped, and the list is cut at the first drop between
+       consecutive scores larger than max_gap, so a clear best match is sent alone.
+    3. The rest are picked by maximal marginal relevance (MMR), skipping documents that are
+       near-duplicates of one already picked.
+
+    No remote calls are made: scores come from the first search, similarities between
+    documents from their stored embeddings.
+    """
+
+    def __init__(self, min_score=0.3, max_gap=0.05, mmr_lambda=0.7, max_redundancy=0.95, boost=0.02):
+        self.min_score = min_score
+        self.max_gap = max_gap
+        self.mmr_lambda = mmr_lambda
+        self.max_redundancy = max_redundancy
+        self.boost = boost
+
+    def rerank(self, results, vectors, texts, user_data=None, num_results=3):
+        """
+        Args:
+            results: (name, cosine similarity) tuples from the first search, highest first
+            vectors: Function returning the normalized embeddings of a list of names as rows
+            texts: Function returning the text of a name
+            user_data: Validated user data, for the HMO and tier boost
+            num_results: Maximum number of documents to keep
+
+        Returns:
+            List of (name, score) tuples to use as context, best first
+        """
+        if not results:
+            return []
+
+        boosted = sorted(
+            ((name, score + self._boost(name, texts, user_data)) for name, score in results),
+            key=lambda result: result[1],
+            reverse=True,
+        )
+        kept = self._cut_off(boosted)
+        selected = self._mmr(kept, vectors, num_results)
+
+        logger.info(
+            f"Re-ranking kept {len(selected)} of {len(results)} documents: "
+            + ", ".join(f"{name} ({score:.3f})" for name, score in selected)
+        )
+        return selected
+
+    def _boost(self, name, texts, user_data):
+        insurance = (user_data or {}).get("healthInsurance", {})
+        terms = [term for term in (insurance.get("hmoName"), insurance.get("membershipTier")) if term]
+        if not terms:
+            return 0.0
+        text = texts(name) or ""
+        return self.boost * sum(1 for term in terms if term in text)
+
+    def _cut_off(self, results):
+        kept = []
+        for name, score in results:
+            if score < self.min_score:
+                break
+            if kept and kept[-1][1] - score > self.max_gap:
+                break
+            kept.append((name, score))
+        return kept
+
+    def _mmr(self, results, vectors, num_results):
+        if len(results) <= 1:
+            return results[:num_results]
+
+        matrix = vectors([name for name, _ in results])
+        similarity = matrix @ matrix.T
+        relevance = np.array([score for _, score in results])
+
+        selected = [0]
+        remaining = list(range(1, len(results)))
+        while remaining and len(selected) < num_results:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            mmr = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(mmr))
+            index = remaining.pop(best)
+            if redundancy[best] < self.max_redundancy:
+                selected.append(index)
+        return [results[index] for index in selected]
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """
+    Server-side chat transcripts, so clients only send the new message of each turn.
+
+    Sessions idle for longer than ttl_seconds are dropped, and at most max_sessions are kept
+    (least recently used first out).
+    """
+
+    def __init__(self, max_sessions=1000, ttl_seconds=24 * 60 * 60):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_user_message(self, session_id, content, message_id):
+        """
+        Append a user message, unless a message with the same ID was already added
+
+        Returns:
+            The session's transcript, including the message
+        """
+        with self._lock:
+            session = self._get(session_id)
+            if message_id not in session["message_ids"]:
+                session["message_ids"].add(message_id)
+                session["messages"].append({"role": "user", "content": content})
+            return list(session["messages"])
+
+    def add_reply(self, session_id, message_id, content):
+        with self._lock:
+            session = self._get(session_id)
+            session["messages"].append({"role": "assistant", "content": content})
+            session["replies"][message_id] = content
+
+    def reply_for(self, session_id, message_id):
+        """The reply already given to a message, or None"""
+        with self._lock:
+            return self._get(session_id)["replies"].get(message_id)
+
+    def page(self, session_id, offset=0, limit=20):
+        """
+        Returns:
+            Tuple of (messages from offset to offset + limit, total number of messages); an
+            unknown session is empty and is not created
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or time.time() - session["updated"] >= self.ttl_seconds:
+                return [], 0
+            messages = session["messages"]
+            return messages[offset:offset + limit], len(messages)
+
+    def _get(self, session_id):
+        """Return a session, creating it if needed. Called with the lock held."""
+        now = time.time()
+        # An expired session starts over, even if it is the oldest one
+        session = self._sessions.get(session_id)
+        if session is not None and now - session["updated"] >= self.ttl_seconds:
+            del self._sessions[session_id]
+
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) < self.max_sessions and now - oldest["updated"] < self.ttl_seconds:
+                break
+            if oldest_id == session_id:
+                break
+            del self._sessions[oldest_id]
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = {"messages": [], "message_ids": set(), "replies": {}, "updated": now}
+            self._sessions[session_id] = session
+        session["updated"] = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+
+def parse_transcript(chat_history):
+    """
+    Convert a "User: ... / Assistant: ..." transcript, as sent to /generate_response, into messages.
+    Lines without a prefix continue the previous message, so multi-line messages stay whole.
+    """
+    messages = []
+    for line in chat_history.split("\n"):
+        for prefix, role in (("User:", "user"), ("Assistant:", "assistant")):
+            if line.startswith(prefix):
+                messages.append({"role": role, "content": line[len(prefix):].strip()})
+                break
+        else:
+            if messages:
+                messages[-1]["content"] += "\n" + line
+
+    for message in messages:
+        message["content"] = message["content"].rstrip("\n")
+    return messages
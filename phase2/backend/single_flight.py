@@ -0,0 +1,31 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the work in a worker
+    thread, and callers arriving while it is still running await the same result (or exception).
+    Nothing is cached once the work finishes.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+
+    async def run(self, key, func, *args):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            logger.info(f"Joining in-flight request {key[:12]}")
+
+        # A caller that disconnects must not cancel the work the other callers are waiting for
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
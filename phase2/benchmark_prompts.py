@@ -0,0 +1,124 @@
+"""
+Compares prompt building with the templates in backend/prompts.py against the previous
+f-strings, which embedded the per-turn data in the middle of the system prompt.
+
+    python phase2/benchmark_prompts.py [--turns 20] [--repeat 2000]
+
+Reports the build time per turn and the share of each prompt that is a cacheable prefix,
+i.e. identical to the start of the previous turn's prompt.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+PHASE2_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PHASE2_DIR))
+sys.path.insert(0, PHASE2_DIR)
+
+from backend.prompts import (  # noqa: E402
+    COLLECTION_PROMPT, QNA_PROMPT, compact_json,
+)
+
+VALIDATION_RESULTS = {
+    "valid": True,
+    "errors": {},
+    "validated_data": {
+        "personalInfo": {"firstName": "Moshe", "lastName": "Cohen", "idNumber": "039337423", "gender": "Male", "age": "34"},
+        "healthInsurance": {"hmoName": "מכבי", "hmoCardNumber": "123456789", "membershipTier": "זהב"},
+        "confirmation": True,
+    },
+}
+
+
+def retrieved_context(turn):
+    """RAG context as retrieved for a turn's question; it changes with every question"""
+    return f"\n[Source: service_{turn}.html, Similarity: 0.8123]\n" + "<tr><td>ניקוי אבנית</td><td>זהב: 80% הנחה</td></tr>\n" * 40
+
+
+def legacy_qna_messages(messages, context):
+    """The previous prompt: per-turn data inside the system prompt, the transcript in one user message"""
+    chat_history = "".join(
+        f"{'User: ' if m['role'] == 'user' else 'Assistant: '}{m['content']}\n" for m in messages
+    )
+    system_prompt = f"""
+        # Role
+        You are a helpful healthcare assistant providing information to a user. You must communicate only in Hebrew or English.
+
+        # User Information
+        The user has provided the following information:
+        {json.dumps(VALIDATION_RESULTS["validated_data"], indent=2, ensure_ascii=False)}
+
+        # Context
+        The following information might be relevant to the user's questions:
+        {context}
+
+        # Task
+        - Answer the user's questions based on their information and the relevant context provided.
+        """
+    context = f"""
+        Below is the conversation history. Answer the user's latest question:
+
+        {chat_history}
+        """
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": context}]
+
+
+def template_qna_messages(messages, context):
+    return QNA_PROMPT.build(
+        messages, user_data=compact_json(VALIDATION_RESULTS["validated_data"]), context=context
+    )
+
+
+def common_prefix_share(previous, current):
+    """Share of the current prompt's characters that repeat the previous prompt from its start"""
+    previous_text = "\x00".join(m["role"] + m["content"] for m in previous)
+    current_text = "\x00".join(m["role"] + m["content"] for m in current)
+    length = 0
+    for a, b in zip(previous_text, current_text):
+        if a != b:
+            break
+        length += 1
+    return length / len(current_text)
+
+
+def conversation(turns):
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Question {turn}: מה הכיסוי לטיפולי שיניים?\nתודה"})
+        messages.append({"role": "assistant", "content": f"Answer {turn}: " + "פרטי הכיסוי. " * 30})
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt build benchmark")
+    parser.add_argument("--turns", type=int, default=20, help="Number of conversation turns")
+    parser.add_argument("--repeat", type=int, default=2000, help="Builds per measurement")
+    args = parser.parse_args()
+
+    # The templates log every build; keep the output to the results
+    logging.getLogger("backend.prompts").setLevel(logging.WARNING)
+
+    messages = conversation(args.turns)
+    # Each turn's prompt holds the conversation up to and including that turn's question
+    histories = [messages[:2 * turn + 1] for turn in range(args.turns)]
+
+    print(f"QnA prompt over a {args.turns}-turn conversation:")
+    for label, build in (("f-string (previous)", legacy_qna_messages), ("template", template_qna_messages)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            build(histories[-1], retrieved_context(args.turns - 1))
+        build_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+        prompts = [build(history, retrieved_context(turn)) for turn, history in enumerate(histories)]
+        shares = [common_prefix_share(a, b) for a, b in zip(prompts, prompts[1:])]
+        print(f"  {label:<22} build {build_us:8.1f} us   cacheable prefix {sum(shares) / len(shares):6.1%}")
+
+    print(f"\nStatic system prompts (est. tokens): qna {QNA_PROMPT.static_tokens}, "
+          f"collection {COLLECTION_PROMPT.static_tokens}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares the embedding types of the RAG corpus store on a synthetic corpus: resident memory,
+query latency and recall of the top results against the exact float32 search.
+
+    python phase2/benchmark_rag.py [--documents 20000] [--dimensions 1536] [--queries 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+PHASE2_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(PHASE2_DIR))
+sys.path.insert(0, PHASE2_DIR)
+
+from backend.corpus import CorpusStore  # noqa: E402
+
+
+def synthetic_corpus(documents, dimensions, queries, seed=0):
+    """Clustered embeddings, with queries near random documents, as real embeddings are not uniform"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(documents // 100, 1), dimensions)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=documents)]
+    vectors += 0.6 * rng.normal(size=(documents, dimensions)).astype(np.float32)
+    targets = rng.integers(documents, size=queries)
+    query_vectors = vectors[targets] + 0.8 * rng.normal(size=(queries, dimensions)).astype(np.float32)
+    return vectors, query_vectors
+
+
+def measure(store, query_vectors, num_results):
+    results = []
+    start = time.perf_counter()
+    for query in query_vectors:
+        results.append([name for name, _ in store.search(query, num_results)])
+    latency_ms = (time.perf_counter() - start) / len(query_vectors) * 1000
+    return results, latency_ms
+
+
+def recall(results, expected):
+    hits = sum(len(set(found) & set(exact)) for found, exact in zip(results, expected))
+    return hits / sum(len(exact) for exact in expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG corpus store benchmark")
+    parser.add_argument("--documents", type=int, default=20000, help="Number of documents")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--top", type=int, default=3, help="Results per query")
+    parser.add_argument("--candidates", type=int, default=50, help="Re-ranked candidates of quantized searches")
+    args = parser.parse_args()
+
+    vectors, query_vectors = synthetic_corpus(args.documents, args.dimensions, args.queries)
+    names = [f"doc{i}" for i in range(args.documents)]
+    python_lists_bytes = args.documents * (args.dimensions * (24 + 8) + 56)  # boxed floats in lists
+
+    print(f"{args.documents} documents x {args.dimensions} dimensions, {args.queries} queries, top {args.top}")
+    print(f"  {'embeddings':<22}{'resident MB':>12}{'ms / query':>12}{'recall':>9}")
+    print(f"  {'python lists (before)':<22}{python_lists_bytes / 1e6:>12.1f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = None
+        configurations = [("float32", 0), ("float16", 0), ("int8", 0), ("int8", args.candidates),
+                          ("binary", 0), ("binary", args.candidates)]
+        for dtype, candidates in configurations:
+            store = CorpusStore(os.path.join(directory, f"{dtype}{candidates}.texts"), dtype, candidates)
+            store.set_embeddings(names, vectors)
+            results, latency_ms = measure(store, query_vectors, args.top)
+            if expected is None:
+                expected = results
+
+            label = f"{dtype} + rerank {candidates}" if candidates else dtype
+            resident_mb = store.memory_usage()["embedding_bytes"] / 1e6
+            print(f"  {label:<22}{resident_mb:>12.1f}{latency_ms:>12.2f}{recall(results, expected):>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
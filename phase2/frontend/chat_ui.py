@@ -7,7 +7,8 @@ import sys
 import os
 from pathlib import Path
 import logging
-from client import generate_response
+import uuid
+from client import send_message, fetch_history, fetch_message_count, check_ready
 
 
 load_dotenv()
@@ -32,42 +33,90 @@ st.title(args.title)
 
 logger.info("Streamlit app has started")
 
+# Questions about medical services need the knowledge base, which loads in the background
+if not st.session_state.get("backend_ready"):
+    st.session_state.backend_ready = check_ready()
+    if not st.session_state.backend_ready:
+        st.info("The knowledge base is still loading. You can start filling in your details meanwhile.")
+
 USER_AVATAR = "👤"
 BOT_AVATAR = "🤖"
 
+# Number of messages shown per page. Only the latest page is kept here; the full
+# transcript lives in the backend, and earlier pages are fetched on request.
+PAGE_SIZE = 20
+
 # Initialize messages in session state if not present
 if "messages" not in st.session_state:
     st.session_state.messages = []
+    st.session_state.message_count = 0
+    st.session_state.visible_count = PAGE_SIZE
 
-# Display chat messages
-for message in st.session_state.messages:
+# Identifies this browser session to the backend, which keeps its transcript
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+
+def render_message(message):
     avatar = USER_AVATAR if message["role"] == "user" else BOT_AVATAR
     with st.chat_message(message["role"], avatar=avatar):
         st.markdown(message["content"])
 
+
+# Earlier pages, only when asked for
+hidden_count = st.session_state.message_count - st.session_state.visible_count
+if st.session_state.message_count > st.session_state.visible_count:
+    if st.button(f"Show earlier messages ({hidden_count})"):
+        st.session_state.visible_count += PAGE_SIZE
+
+earlier_count = min(st.session_state.visible_count, st.session_state.message_count) - len(st.session_state.messages)
+if earlier_count > 0:
+    offset = st.session_state.message_count - len(st.session_state.messages) - earlier_count
+    for message in fetch_history(st.session_state.session_id, offset, earlier_count):
+        render_message(message)
+
+# Display chat messages
+for message in st.session_state.messages:
+    render_message(message)
+
+# A message whose reply has not arrived keeps its ID, so resending it lets the backend
+# recognize the resend instead of answering the message twice
+pending = st.session_state.get("pending")
+retry = pending is not None and st.button("Resend last message")
+
 # Main chat interface
-if prompt := st.chat_input("How can I help?"):
+prompt = st.chat_input("How can I help?")
+if prompt and (pending is None or pending["prompt"] != prompt):
+    pending = st.session_state.pending = {"prompt": prompt, "message_id": uuid.uuid4().hex}
+
     # Add user message to session state
     st.session_state.messages.append({"role": "user", "content": prompt})
+    render_message(st.session_state.messages[-1])
 
-    with st.chat_message("user", avatar=USER_AVATAR):
-        st.markdown(prompt)
-
+if prompt or retry:
     with st.chat_message("assistant", avatar=BOT_AVATAR):
         message_placeholder = st.empty()
 
-        # Convert message history to formatted string
-        message_string = ""
-        for msg in st.session_state.messages:
-            prefix = "User: " if msg["role"] == "user" else "Assistant: "
-            message_string += f"{prefix}{msg['content']}\n"
-
-        # Pass the formatted message string to generate_response
-        full_response = generate_response(message_string)
+        # Only the new message is sent
+        full_response, message_count = send_message(
+            st.session_state.session_id, pending["prompt"], pending["message_id"]
+        )
 
         message_placeholder.markdown(full_response)
 
-    # Add assistant response to session state
-    st.session_state.messages.append({"role": "assistant", "content": full_response})
+    if message_count is None:
+        # The backend may or may not have stored the message, so its count is asked for;
+        # the failed reply is not added to the transcript
+        message_count = fetch_message_count(st.session_state.session_id)
+        if message_count is not None:
+            st.session_state.message_count = message_count
+    else:
+        del st.session_state.pending
+
+        # Add assistant response to session state, keeping only the latest page
+        st.session_state.messages.append({"role": "assistant", "content": full_response})
+        st.session_state.messages = st.session_state.messages[-PAGE_SIZE:]
+        st.session_state.message_count = message_count
+        st.session_state.visible_count = PAGE_SIZE
 
 # streamlit run streamlit_chat_ui.py -- --clean
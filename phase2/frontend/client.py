@@ -14,19 +14,57 @@ logger = logging.getLogger(__name__)
 API_BASE_URL = "http://localhost:5051"
 
 
-def generate_response(chat_history):
-    logger.info(f"Inside generate_response. chat_history: {chat_history}")
+def send_message(session_id, message, message_id):
+    """
+    Send a single new message; the backend keeps the transcript of the session
+
+    Returns:
+        Tuple of (response text, total number of messages in the session, or None on error)
+    """
     try:
-        # Sending the user input to FastAPI and receiving AI response
         response = requests.post(
-            f"{API_BASE_URL}/generate_response", params={"chat_history": chat_history}
+            f"{API_BASE_URL}/chat",
+            json={"session_id": session_id, "message": message, "message_id": message_id},
         )
-        logger.info(f"Response: {response}")
         if response.status_code == 200:
-            return response.json().get("response", "No AI response")
-        else:
-            return f"Error: Failed to get AI response. Status code: {response.status_code}"
+            body = response.json()
+            return body.get("response", "No AI response"), body.get("message_count")
+        return f"Error: Failed to get AI response. Status code: {response.status_code}", None
     except requests.exceptions.RequestException as e:
         logger.error(f"API request failed: {str(e)}")
-        return {"response": f"Error communicating with the server: {str(e)}"}
+        return f"Error communicating with the server: {str(e)}", None
+
+
+def fetch_history(session_id, offset, limit):
+    """Fetch a page of the session's transcript, an empty list on error"""
+    try:
+        response = requests.get(
+            f"{API_BASE_URL}/history",
+            params={"session_id": session_id, "offset": offset, "limit": limit},
+        )
+        if response.status_code == 200:
+            return response.json().get("messages", [])
+    except requests.exceptions.RequestException as e:
+        logger.error(f"API request failed: {str(e)}")
+    return []
+
 
+def fetch_message_count(session_id):
+    """Total number of messages in the session's transcript, None on error"""
+    try:
+        response = requests.get(
+            f"{API_BASE_URL}/history", params={"session_id": session_id, "offset": 0, "limit": 0}
+        )
+        if response.status_code == 200:
+            return response.json().get("total")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"API request failed: {str(e)}")
+    return None
+
+
+def check_ready():
+    """Return True once the backend has loaded its knowledge base index"""
+    try:
+        return requests.get(f"{API_BASE_URL}/ready", timeout=2).status_code == 200
+    except requests.exceptions.RequestException:
+        return False
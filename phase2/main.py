@@ -1,10 +1,14 @@
-from backend.app import ChatbotApp
 import logging
 import threading
 import os
 import subprocess
 import sys
 
+# Make the project root importable, for the validation rules shared with phase1
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.app import ChatbotApp
+
 # Configure root logger
 logging.basicConfig(
     level=logging.INFO,